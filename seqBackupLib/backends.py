@@ -0,0 +1,404 @@
+import base64
+import hashlib
+import math
+import os
+import shutil
+import stat
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+from typing import Iterator, Optional, Union
+
+from seqBackupLib.checksum import ChunkHasher, copy_with_md5, read_chunks, verify_md5
+from seqBackupLib.chunk_manifest import ChunkManifest
+from seqBackupLib.locking import lane_lock
+from seqBackupLib.space import SpaceReservation, reserve_space
+from seqBackupLib.throttle import RateLimiter
+
+MIN_PART_SIZE = 8 * 1024 * 1024  # 8MB, S3 requires at least 5MB
+MAX_PART_SIZE = 5 * 1024 * 1024 * 1024  # 5GB, the S3 limit
+TARGET_PARTS = 1000
+MAX_BUFFER_SIZE = 512 * 1024 * 1024  # 512MB of parts in flight at once
+DEFAULT_S3_WORKERS = 8
+
+
+def _fsync(fp: Path) -> None:
+    # works for directories as well as files
+    fd = os.open(fp, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _chunk_hasher(manifest: Optional[ChunkManifest]) -> Optional[ChunkHasher]:
+    # per-chunk digests are only collected when a chunk manifest was asked for
+    return ChunkHasher(manifest.chunk_size) if manifest is not None else None
+
+
+def _add_chunks(
+    manifest: Optional[ChunkManifest], name: str, chunks: Optional[ChunkHasher]
+) -> None:
+    if manifest is not None:
+        manifest.add(name, chunks.size, chunks.digests())
+
+
+class LocalArchive:
+    def __init__(
+        self,
+        staging_dir: Path,
+        write_dir: Path,
+        reservation: SpaceReservation,
+        verify: bool = False,
+        limiter: Optional[RateLimiter] = None,
+        chunk_size: Optional[int] = None,
+    ):
+        self.staging_dir = staging_dir
+        self.write_dir = write_dir
+        self.reservation = reservation
+        self.verify = verify
+        self.limiter = limiter
+        self.chunk_manifest = (
+            ChunkManifest(chunk_size) if chunk_size is not None else None
+        )
+        # flush (and verify) each written file while the next one is being copied
+        self._syncer = ThreadPoolExecutor(max_workers=1)
+        self._syncs = []
+
+    @property
+    def location(self) -> Path:
+        return self.write_dir
+
+    def put_file(self, src: Path, name: str) -> str:
+        output_fp = self.staging_dir / name
+        chunks = _chunk_hasher(self.chunk_manifest)
+        md5 = copy_with_md5(src, output_fp, self.limiter, chunks)
+        _add_chunks(self.chunk_manifest, name, chunks)
+        self.reservation.consume(output_fp.stat().st_size)
+        output_fp.chmod(stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+        if self.verify:
+            self._syncs.append(
+                self._syncer.submit(verify_md5, output_fp, md5, self.limiter)
+            )
+        else:
+            self._syncs.append(self._syncer.submit(_fsync, output_fp))
+        return md5
+
+    def put_bytes(self, name: str, data: bytes) -> None:
+        output_fp = self.staging_dir / name
+        output_fp.write_bytes(data)
+        self._syncs.append(self._syncer.submit(_fsync, output_fp))
+
+    def close(self) -> None:
+        try:
+            [sync.result() for sync in self._syncs]
+        finally:
+            self._syncer.shutdown()
+
+    def publish(self) -> None:
+        # Everything in the staging directory is on disk, so a single rename
+        # makes the complete lane visible to readers at once
+        _fsync(self.staging_dir)
+        if self.write_dir.exists():
+            raise FileExistsError("Archive already exists", str(self.write_dir))
+        os.rename(self.staging_dir, self.write_dir)
+        _fsync(self.write_dir.parent)
+
+
+class LocalBackend:
+    def __init__(
+        self,
+        dest_dir: Path,
+        verify: bool = False,
+        limiter: Optional[RateLimiter] = None,
+        chunk_size: Optional[int] = None,
+        reservation_dir: Optional[Path] = None,
+    ):
+        self.dest_dir = dest_dir
+        self.verify = verify
+        self.limiter = limiter
+        self.chunk_size = chunk_size
+        # shared by every archive root on the same volume, if set
+        self.reservation_dir = reservation_dir
+
+    @contextmanager
+    def lock(
+        self, archive_name: str, policy: str = "wait", timeout: Optional[float] = None
+    ) -> Iterator[None]:
+        with lane_lock(self.dest_dir, archive_name, policy, timeout):
+            # a lane that was archived while we waited doesn't need any more work
+            if (self.dest_dir / archive_name).exists():
+                raise FileExistsError(
+                    "Archive already exists", str(self.dest_dir / archive_name)
+                )
+            yield
+
+    @contextmanager
+    def open_archive(
+        self, archive_name: str, required_bytes: int
+    ) -> Iterator[LocalArchive]:
+        write_dir = self.dest_dir / archive_name
+        if write_dir.exists():
+            raise FileExistsError("Archive already exists", str(write_dir))
+
+        # make sure the destination can hold the whole lane before copying anything
+        self.dest_dir.mkdir(parents=True, exist_ok=True)
+        # staging left behind by a crashed backup of this lane; callers hold the
+        # lane lock, so no other process is still writing to it
+        for stale in self.dest_dir.glob(f".{archive_name}.tmp.*"):
+            shutil.rmtree(stale)
+
+        with reserve_space(
+            self.dest_dir, archive_name, required_bytes, self.reservation_dir
+        ) as reservation:
+            # stage the lane in a hidden folder on the same filesystem
+            staging_dir = self.dest_dir / f".{archive_name}.tmp.{os.getpid()}"
+            staging_dir.mkdir(exist_ok=False)
+
+            archive = LocalArchive(
+                staging_dir,
+                write_dir,
+                reservation,
+                self.verify,
+                self.limiter,
+                self.chunk_size,
+            )
+            try:
+                try:
+                    yield archive
+                finally:
+                    archive.close()
+                archive.publish()
+            except BaseException:
+                shutil.rmtree(staging_dir, ignore_errors=True)
+                raise
+
+
+def choose_part_size(size: int) -> int:
+    # Aim for about TARGET_PARTS parts, rounded up to a whole MB
+    mb = 1024 * 1024
+    part_size = math.ceil(size / TARGET_PARTS / mb) * mb
+    return min(max(part_size, MIN_PART_SIZE), MAX_PART_SIZE)
+
+
+def choose_concurrency(size: int, part_size: int, max_workers: int) -> int:
+    n_parts = max(math.ceil(size / part_size), 1)
+    return max(min(max_workers, n_parts, MAX_BUFFER_SIZE // part_size), 1)
+
+
+def _content_md5(digest: bytes) -> str:
+    return base64.b64encode(digest).decode("ascii")
+
+
+class S3Archive:
+    def __init__(
+        self,
+        client,
+        bucket: str,
+        prefix: str,
+        max_workers: int = DEFAULT_S3_WORKERS,
+        verify: bool = False,
+        limiter: Optional[RateLimiter] = None,
+        chunk_size: Optional[int] = None,
+    ):
+        self.client = client
+        self.bucket = bucket
+        self.prefix = prefix
+        self.max_workers = max_workers
+        self.verify = verify
+        self.limiter = limiter
+        self.chunk_manifest = (
+            ChunkManifest(chunk_size) if chunk_size is not None else None
+        )
+
+    @property
+    def location(self) -> str:
+        return f"s3://{self.bucket}/{self.prefix}"
+
+    def _key(self, name: str) -> str:
+        return f"{self.prefix}/{name}"
+
+    def _check_etag(self, response: dict, digest: bytes, name: str) -> str:
+        # Plain (non-KMS) uploads report the md5 of the body as the ETag
+        etag = response["ETag"]
+        if self.verify and etag.strip('"') != digest.hex():
+            raise IOError("Uploaded part does not match the source", name, etag)
+        return etag
+
+    def put_file(self, src: Path, name: str) -> str:
+        size = src.stat().st_size
+        part_size = choose_part_size(size)
+        chunks = _chunk_hasher(self.chunk_manifest)
+        if size <= part_size:
+            data = src.read_bytes()
+            if self.limiter is not None:
+                self.limiter.consume(len(data))
+            if chunks is not None:
+                chunks.update(data)
+            _add_chunks(self.chunk_manifest, name, chunks)
+            digest = hashlib.md5(data).digest()
+            response = self.client.put_object(
+                Bucket=self.bucket,
+                Key=self._key(name),
+                Body=data,
+                ContentMD5=_content_md5(digest),
+            )
+            self._check_etag(response, digest, name)
+            return digest.hex()
+
+        key = self._key(name)
+        upload_id = self.client.create_multipart_upload(Bucket=self.bucket, Key=key)[
+            "UploadId"
+        ]
+        concurrency = choose_concurrency(size, part_size, self.max_workers)
+        # bound the number of parts held in memory to the number of workers
+        in_flight = threading.Semaphore(concurrency)
+
+        def upload_part(part_number: int, data: bytes, digest: bytes) -> dict:
+            try:
+                response = self.client.upload_part(
+                    Bucket=self.bucket,
+                    Key=key,
+                    UploadId=upload_id,
+                    PartNumber=part_number,
+                    Body=data,
+                    ContentMD5=_content_md5(digest),
+                )
+                etag = self._check_etag(response, digest, f"{name} part {part_number}")
+                return {"ETag": etag, "PartNumber": part_number}
+            finally:
+                in_flight.release()
+
+        hash_md5 = hashlib.md5()
+        try:
+            with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                uploads = []
+                running = []
+                with open(src, "rb") as f:
+                    for part_number, data in enumerate(
+                        read_chunks(f, self.limiter, part_size), start=1
+                    ):
+                        hash_md5.update(data)
+                        if chunks is not None:
+                            chunks.update(data)
+                        in_flight.acquire()
+                        # stop reading at the first failed part rather than
+                        # uploading the rest of the file for nothing
+                        still_running = []
+                        for upload in running:
+                            if upload.done():
+                                upload.result()
+                            else:
+                                still_running.append(upload)
+                        running = still_running
+                        uploads.append(
+                            pool.submit(
+                                upload_part,
+                                part_number,
+                                data,
+                                hashlib.md5(data).digest(),
+                            )
+                        )
+                        running.append(uploads[-1])
+                parts = [upload.result() for upload in uploads]
+            self.client.complete_multipart_upload(
+                Bucket=self.bucket,
+                Key=key,
+                UploadId=upload_id,
+                MultipartUpload={"Parts": parts},
+            )
+        except BaseException:
+            self.client.abort_multipart_upload(
+                Bucket=self.bucket, Key=key, UploadId=upload_id
+            )
+            raise
+        _add_chunks(self.chunk_manifest, name, chunks)
+        return hash_md5.hexdigest()
+
+    def put_bytes(self, name: str, data: bytes) -> None:
+        digest = hashlib.md5(data).digest()
+        response = self.client.put_object(
+            Bucket=self.bucket,
+            Key=self._key(name),
+            Body=data,
+            ContentMD5=_content_md5(digest),
+        )
+        self._check_etag(response, digest, name)
+
+
+class S3Backend:
+    def __init__(
+        self,
+        client,
+        bucket: str,
+        prefix: str = "",
+        max_workers: int = DEFAULT_S3_WORKERS,
+        verify: bool = False,
+        limiter: Optional[RateLimiter] = None,
+        lock_dir: Optional[Path] = None,
+        chunk_size: Optional[int] = None,
+    ):
+        self.client = client
+        self.bucket = bucket
+        self.prefix = prefix.strip("/")
+        self.max_workers = max_workers
+        self.verify = verify
+        self.limiter = limiter
+        self.lock_dir = lock_dir
+        self.chunk_size = chunk_size
+
+    @classmethod
+    def from_url(cls, url: str, endpoint_url: Optional[str] = None, **kwargs):
+        try:
+            import boto3
+        except ImportError:
+            raise ImportError(
+                "boto3 is required for s3:// destinations: pip install seqBackup[s3]"
+            )
+        bucket, _, prefix = url[len("s3://") :].partition("/")
+        client = boto3.client("s3", endpoint_url=endpoint_url)
+        return cls(client, bucket, prefix, **kwargs)
+
+    def lock(
+        self, archive_name: str, policy: str = "wait", timeout: Optional[float] = None
+    ):
+        # object stores have no advisory locks, so workers that share a
+        # filesystem can coordinate through lock_dir instead
+        if self.lock_dir is None:
+            return nullcontext()
+        return lane_lock(self.lock_dir, archive_name, policy, timeout)
+
+    def _object_exists(self, key: str) -> bool:
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=key)
+        except Exception as exc:
+            # botocore's ClientError carries the HTTP status of a missing key
+            error = getattr(exc, "response", {}).get("Error", {})
+            if error.get("Code") in {"404", "NoSuchKey", "NotFound"}:
+                return False
+            raise
+        return True
+
+    @contextmanager
+    def open_archive(
+        self, archive_name: str, required_bytes: int
+    ) -> Iterator[S3Archive]:
+        prefix = "/".join(p for p in [self.prefix, archive_name] if p)
+        # the md5 manifest is written last, so it marks a finished lane
+        if self._object_exists(f"{prefix}/{archive_name}.md5"):
+            raise FileExistsError(
+                "Archive already exists", f"s3://{self.bucket}/{prefix}"
+            )
+        yield S3Archive(
+            self.client,
+            self.bucket,
+            prefix,
+            self.max_workers,
+            self.verify,
+            self.limiter,
+            self.chunk_size,
+        )
+
+
+ArchiveBackend = Union[LocalBackend, S3Backend]
@@ -1,25 +1,51 @@
 import argparse
 import os
-import shutil
-import stat
 import re
 import gzip
-import hashlib
+import time
 import warnings
 from pathlib import Path
+from typing import Optional
+from seqBackupLib.backends import (
+    DEFAULT_S3_WORKERS,
+    ArchiveBackend,
+    LocalBackend,
+    S3Backend,
+)
+from seqBackupLib.chunk_manifest import (
+    DEFAULT_CHUNK_SIZE,
+    chunk_size_argument,
+    manifest_name,
+)
+from seqBackupLib.checksum import copy_with_md5, return_md5, verify_md5
 from seqBackupLib.illumina import IlluminaFastq
+from seqBackupLib.locking import LOCK_POLICIES
+from seqBackupLib.sample_sheet import check_sample_sheet, parse_sample_sheet
+from seqBackupLib.profiling import Profiler, profile_phase
+from seqBackupLib.results import BackupResult, CheckResult, FileResult
+from seqBackupLib.run_info import find_run_info
+from seqBackupLib.throttle import (
+    IO_PRIORITY_CLASSES,
+    RateLimiter,
+    add_bandwidth_argument,
+    set_io_priority,
+)
 
 DEFAULT_MIN_FILE_SIZE = 500000000  # 500MB
+# the <run>_L00N folder each lane is archived to
+ARCHIVE_DIR_REGEX = re.compile(r"(.+)_L(\d{3})")
 
 
-def build_fp_to_archive(fp: Path, has_index: bool, lane: str) -> list[Path]:
+def build_fp_to_archive(
+    fp: Path, has_index: bool, lane: str, n_index_reads: int = 2
+) -> list[Path]:
 
     if re.search("R1_001.fastq", fp.name) is None:
         raise IOError("The file doesn't look like an R1 file: {}".format(fp))
 
     label = ["R2"]
     if has_index:
-        label.extend(["I1", "I2"])
+        label.extend(["I1", "I2"][:n_index_reads])
 
     if "_L" in fp.name:
         rexp = "".join(["(L00", lane, "_)(R1)(_001.fastq.gz)$"])
@@ -31,109 +57,233 @@ def build_fp_to_archive(fp: Path, has_index: bool, lane: str) -> list[Path]:
     return [fp] + [fp.parent / n for n in modified_fp]
 
 
-def return_md5(fp: Path) -> str:
-    # from https://stackoverflow.com/questions/3431825/generating-an-md5-checksum-of-a-file
-    hash_md5 = hashlib.md5()
-    with open(fp, "rb") as f:
-        for chunk in iter(lambda: f.read(4096), b""):
-            hash_md5.update(chunk)
-    return hash_md5.hexdigest()
-
-
-def backup_fastq(
+def archive_fastq(
     forward_reads: Path,
-    dest_dir: Path,
+    dest_dir: Optional[Path],
     sample_sheet_fp: Path,
     has_index: bool,
     min_file_size: int,
     allow_check_failures: bool = False,
-):
-
-    R1 = IlluminaFastq(gzip.open(forward_reads, mode="rt"))
-
-    # build the strings for the required files
-    RI_fps = build_fp_to_archive(forward_reads, has_index, R1.lane)
-
-    # create the Illumina objects and check the files
-    illumina_fastqs = [IlluminaFastq(gzip.open(fp, mode="rt")) for fp in RI_fps]
-    r1 = illumina_fastqs[0]
-
-    fp_vs_content_results = [ifq.check_fp_vs_content()[0] for ifq in illumina_fastqs]
-    if not all(fp_vs_content_results):
-        [ifq.check_fp_vs_content(verbose=True) for ifq in illumina_fastqs]
-        message = (
-            "The file path and header information don't match",
-            [
-                str(ifq)
-                for ifq, ok in zip(illumina_fastqs, fp_vs_content_results)
-                if not ok
-            ],
-        )
-        if allow_check_failures:
-            warnings.warn(f"{message[0]}: {message[1]}")
-        else:
-            raise ValueError(*message)
-    file_size_results = [ifq.check_file_size(min_file_size) for ifq in illumina_fastqs]
-    if not all(file_size_results):
-        message = (
-            "File seems suspiciously small. Please check if you have the correct file or"
-            " lower the minimum file size threshold",
-            file_size_results,
-        )
-        if allow_check_failures:
-            warnings.warn(f"{message[0]}: {message[1]}")
-        else:
-            raise ValueError(*message)
-    if not all([ifq.check_index_read_exists() for ifq in illumina_fastqs]):
-        warnings.warn(
-            "No barcodes in headers. Were the fastq files generated properly?"
+    verify: bool = False,
+    limiter: Optional[RateLimiter] = None,
+    validate_sample_sheet: bool = False,
+    backend: Optional[ArchiveBackend] = None,
+    lock_policy: str = "wait",
+    lock_timeout: Optional[float] = None,
+    profiler: Optional[Profiler] = None,
+    chunk_size: Optional[int] = None,
+) -> BackupResult:
+    start = time.monotonic()
+    # dest_dir, verify, limiter and chunk_size only build the default local
+    # filesystem backend; any other backend carries its own settings
+    if backend is None:
+        backend = LocalBackend(dest_dir, verify, limiter, chunk_size)
+    elif verify or limiter is not None or chunk_size is not None:
+        raise ValueError(
+            "verify, limiter and chunk_size must be set on the backend when one "
+            "is given"
         )
+    checks = []
 
-    # parse the info from the headers in EACH file and check they are consistent within each other
-    same_run_results = [
-        fastq.is_same_run(illumina_fastqs[0]) for fastq in illumina_fastqs
-    ]
-    if not all(same_run_results):
-        message = "The files are not from the same run."
-        if allow_check_failures:
-            warnings.warn(message)
-        else:
-            raise ValueError(message)
+    def record_check(name, passed, message, details=None, required=True):
+        checks.append(CheckResult(name, passed, message, details))
+        if not passed and required and not allow_check_failures:
+            raise ValueError(message, details)
 
-    ## Archiving steps
+    with profile_phase(profiler, "parse_r1"):
+        R1 = IlluminaFastq(gzip.open(forward_reads, mode="rt"))
 
-    # make sure the sample sheet exists
-    if not sample_sheet_fp.is_file():
-        raise IOError("Sample sheet does not exist", str(sample_sheet_fp))
+    with profile_phase(profiler, "run_info"):
+        # instrument metadata, when present, says which index reads to expect
+        run_info = find_run_info(forward_reads, R1.run_name)
 
-    # create the folder to write to
-    write_dir = dest_dir / r1.build_archive_dir()
-    write_dir.mkdir(parents=True, exist_ok=False)
+    # claim the lane before the expensive header validation so that duplicate
+    # workers are turned away (or wait) instead of repeating it
+    with backend.lock(R1.build_archive_dir(), lock_policy, lock_timeout):
 
-    ### All the checks are done and the files are safe to archive!
+        with profile_phase(profiler, "open_fastqs"):
+            # build the strings for the required files
+            n_index_reads = run_info.index_read_count if run_info else 2
+            RI_fps = build_fp_to_archive(
+                forward_reads, has_index, R1.lane, n_index_reads
+            )
 
-    # move the files to the archive location and remove permission
-    permission = stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH
-    md5s = []
-    for fp in RI_fps:
-        if "_L" in fp.name:
-            dest_name = fp.name
-        else:
-            dest_name = fp.name.replace("_S0_", f"_S0_L{r1.lane.zfill(3)}_")
-        output_fp = write_dir / dest_name
-        shutil.copyfile(fp, output_fp)
-        output_fp.chmod(permission)
-        md5s.append((dest_name, return_md5(fp)))
+            # fail on missing files before opening any more gzip streams
+            missing_fps = [str(fp) for fp in RI_fps if not fp.is_file()]
+            if missing_fps:
+                raise FileNotFoundError("Missing fastq files", missing_fps)
+
+            # create the Illumina objects and check the files
+            illumina_fastqs = [R1] + [
+                IlluminaFastq(gzip.open(fp, mode="rt")) for fp in RI_fps[1:]
+            ]
+            r1 = illumina_fastqs[0]
+
+        if run_info is not None:
+            record_check(
+                "run_info",
+                int(r1.lane) <= run_info.lane_count,
+                "The lane is not on the flowcell described by RunInfo.xml",
+                {"lane": r1.lane, "lane_count": run_info.lane_count},
+            )
+
+        with profile_phase(profiler, "check_headers"):
+            fp_vs_content_results = [
+                ifq.check_fp_vs_content() for ifq in illumina_fastqs
+            ]
+            if not all(result[0] for result in fp_vs_content_results):
+                [ifq.check_fp_vs_content(verbose=True) for ifq in illumina_fastqs]
+            record_check(
+                "fp_vs_content",
+                all(result[0] for result in fp_vs_content_results),
+                "The file path and header information don't match",
+                [
+                    str(ifq)
+                    for ifq, result in zip(illumina_fastqs, fp_vs_content_results)
+                    if not result[0]
+                ],
+            )
+            file_size_results = [
+                ifq.check_file_size(min_file_size) for ifq in illumina_fastqs
+            ]
+            record_check(
+                "file_size",
+                all(file_size_results),
+                "File seems suspiciously small. Please check if you have the correct file or"
+                " lower the minimum file size threshold",
+                file_size_results,
+            )
+            record_check(
+                "index_reads",
+                all([ifq.check_index_read_exists() for ifq in illumina_fastqs]),
+                "No barcodes in headers. Were the fastq files generated properly?",
+                required=False,
+            )
+
+            # parse the info from the headers in EACH file and check they are consistent within each other
+            same_run_results = [
+                fastq.is_same_run(illumina_fastqs[0]) for fastq in illumina_fastqs
+            ]
+            record_check(
+                "same_run",
+                all(same_run_results),
+                "The files are not from the same run.",
+                same_run_results,
+            )
+
+        ## Archiving steps
+
+        # make sure the sample sheet exists
+        if not sample_sheet_fp.is_file():
+            raise IOError("Sample sheet does not exist", str(sample_sheet_fp))
+
+        # check the lanes and indexes in the sample sheet against the reads
+        if validate_sample_sheet:
+            with profile_phase(profiler, "sample_sheet"):
+                sample_sheet_results = check_sample_sheet(
+                    parse_sample_sheet(sample_sheet_fp), r1
+                )
+                record_check(
+                    "sample_sheet",
+                    sample_sheet_results[0],
+                    "The sample sheet doesn't match the reads",
+                    sample_sheet_results,
+                )
+
+        with profile_phase(profiler, "archive"):
+            sizes = {fp: fp.stat().st_size for fp in RI_fps + [sample_sheet_fp]}
+            archive_name = r1.build_archive_dir()
+            with backend.open_archive(archive_name, sum(sizes.values())) as archive:
 
-    # copy the sample sheet to destination folder
-    shutil.copyfile(sample_sheet_fp, write_dir / sample_sheet_fp.name)
+                ### All the checks are done and the files are safe to archive!
 
-    # write md5sums to a file
-    md5_out_fp = write_dir / ".".join([r1.build_archive_dir(), "md5"])
-    with open(md5_out_fp, "w") as md5_out:
-        [md5_out.write("\t".join(md5) + "\n") for md5 in md5s]
+                # move the files to the archive location and remove permission
+                files = []
+                for fp in RI_fps:
+                    if "_L" in fp.name:
+                        dest_name = fp.name
+                    else:
+                        dest_name = fp.name.replace("_S0_", f"_S0_L{r1.lane.zfill(3)}_")
+                    file_start = time.monotonic()
+                    md5 = archive.put_file(fp, dest_name)
+                    files.append(
+                        FileResult(
+                            dest_name,
+                            str(fp),
+                            sizes[fp],
+                            md5,
+                            time.monotonic() - file_start,
+                        )
+                    )
 
-    return write_dir
+                # copy the sample sheet to destination folder
+                archive.put_bytes(sample_sheet_fp.name, sample_sheet_fp.read_bytes())
+
+                # per-chunk digests let audits find and repair damage within a file
+                if archive.chunk_manifest is not None:
+                    archive.put_bytes(
+                        manifest_name(archive_name), archive.chunk_manifest.to_bytes()
+                    )
+
+                # write md5sums to a file, last, since it marks a finished lane
+                archive.put_bytes(
+                    ".".join([archive_name, "md5"]),
+                    "".join(f"{f.name}\t{f.md5}\n" for f in files).encode(),
+                )
+
+    return BackupResult(
+        archive_name,
+        archive.location,
+        files,
+        checks,
+        time.monotonic() - start,
+        run_info.to_dict() if run_info else None,
+    )
+
+
+def _warn_failed_checks(result: BackupResult) -> None:
+    for check in result.failed_checks:
+        if check.details is None:
+            warnings.warn(check.message)
+        else:
+            warnings.warn(f"{check.message}: {check.details}")
+
+
+def backup_fastq(
+    forward_reads: Path,
+    dest_dir: Optional[Path],
+    sample_sheet_fp: Path,
+    has_index: bool,
+    min_file_size: int,
+    allow_check_failures: bool = False,
+    verify: bool = False,
+    limiter: Optional[RateLimiter] = None,
+    validate_sample_sheet: bool = False,
+    backend: Optional[ArchiveBackend] = None,
+    lock_policy: str = "wait",
+    lock_timeout: Optional[float] = None,
+    profiler: Optional[Profiler] = None,
+    chunk_size: Optional[int] = None,
+):
+    # Reports failed checks as warnings and returns only the archive location
+    result = archive_fastq(
+        forward_reads,
+        dest_dir,
+        sample_sheet_fp,
+        has_index,
+        min_file_size,
+        allow_check_failures,
+        verify,
+        limiter,
+        validate_sample_sheet,
+        backend,
+        lock_policy,
+        lock_timeout,
+        profiler,
+        chunk_size,
+    )
+    _warn_failed_checks(result)
+    return result.location
 
 
 def main(argv=None):
@@ -145,8 +295,7 @@ def main(argv=None):
     parser.add_argument(
         "--destination-dir",
         required=True,
-        type=Path,
-        help="Destination folder to copy the files to.",
+        help="Destination folder to copy the files to, or an s3://bucket/prefix URL.",
     )
     parser.add_argument(
         "--sample-sheet",
@@ -171,14 +320,136 @@ def main(argv=None):
         action="store_true",
         help="Continue archiving even if validation checks fail",
     )
-    args = parser.parse_args(argv)
-    return backup_fastq(
-        args.forward_reads,
-        args.destination_dir,
-        args.sample_sheet,
-        not args.no_index,
-        args.min_file_size,
-        args.allow_check_failures,
+    parser.add_argument(
+        "--verify",
+        action="store_true",
+        help="Re-read each archived file from disk and check it against the source md5",
+    )
+    add_bandwidth_argument(parser)
+    parser.add_argument(
+        "--nice",
+        type=int,
+        default=0,
+        help="Increment to the process niceness, which lowers its CPU priority",
+    )
+    parser.add_argument(
+        "--io-priority",
+        choices=IO_PRIORITY_CLASSES,
+        help="I/O scheduling class: best-effort at the lowest level, or idle to "
+        "only use the disk when nothing else does",
+    )
+    parser.add_argument(
+        "--validate-sample-sheet",
+        action="store_true",
+        help="Check the sample sheet lanes and index sequences against the reads",
+    )
+    parser.add_argument(
+        "--s3-endpoint-url",
+        help="Endpoint of an S3-compatible object store, e.g. a MinIO server",
+    )
+    parser.add_argument(
+        "--s3-workers",
+        type=int,
+        default=DEFAULT_S3_WORKERS,
+        help="Maximum number of parallel part uploads for s3:// destinations",
+    )
+    parser.add_argument(
+        "--lock-policy",
+        choices=LOCK_POLICIES,
+        help="Wait for (default), or immediately skip, a lane another worker is "
+        "backing up",
+    )
+    parser.add_argument(
+        "--lock-timeout",
+        type=float,
+        help="Seconds to wait for the lane lock before giving up (default forever)",
     )
+    parser.add_argument(
+        "--lock-dir",
+        type=Path,
+        help="Shared folder for lane locks of s3:// destinations. Without it, "
+        "s3:// backups of the same lane are not locked against each other",
+    )
+    parser.add_argument(
+        "--reservation-dir",
+        type=Path,
+        help="Folder to track free space reservations in, shared by every "
+        "archive root on the same volume (default: the destination folder)",
+    )
+    parser.add_argument(
+        "--profile",
+        type=Path,
+        help="Profile the validation and archiving phases and write a report here",
+    )
+    parser.add_argument(
+        "--chunk-manifest",
+        type=chunk_size_argument,
+        nargs="?",
+        const=DEFAULT_CHUNK_SIZE,
+        metavar="CHUNK_SIZE",
+        help="Also write the md5 of every CHUNK_SIZE bytes (default 64MB) of each file",
+    )
+    parser.add_argument(
+        "--result-json",
+        type=Path,
+        help="Write the checks, sizes, digests and timings of the backup to this file",
+    )
+    args = parser.parse_args(argv)
+    if args.nice:
+        os.nice(args.nice)
+    if args.io_priority:
+        set_io_priority(args.io_priority)
+    limiter = args.bandwidth_limit
+    is_s3 = args.destination_dir.startswith("s3://")
+    if is_s3 and args.lock_dir is None:
+        if args.lock_policy is not None or args.lock_timeout is not None:
+            parser.error(
+                "--lock-policy and --lock-timeout need --lock-dir for s3:// "
+                "destinations"
+            )
+    if not is_s3 and args.lock_dir is not None:
+        parser.error("--lock-dir is only used for s3:// destinations")
+    if is_s3 and args.reservation_dir is not None:
+        parser.error("--reservation-dir is only used for local destinations")
+    if is_s3:
+        backend = S3Backend.from_url(
+            args.destination_dir,
+            endpoint_url=args.s3_endpoint_url,
+            max_workers=args.s3_workers,
+            verify=args.verify,
+            limiter=limiter,
+            chunk_size=args.chunk_manifest,
+            lock_dir=args.lock_dir,
+        )
+    else:
+        backend = LocalBackend(
+            Path(args.destination_dir),
+            args.verify,
+            limiter,
+            args.chunk_manifest,
+            args.reservation_dir,
+        )
+    profiler = Profiler() if args.profile else None
+    try:
+        result = archive_fastq(
+            args.forward_reads,
+            None,
+            args.sample_sheet,
+            not args.no_index,
+            args.min_file_size,
+            args.allow_check_failures,
+            validate_sample_sheet=args.validate_sample_sheet,
+            backend=backend,
+            lock_policy=args.lock_policy or "wait",
+            lock_timeout=args.lock_timeout,
+            profiler=profiler,
+        )
+    finally:
+        if profiler is not None:
+            profiler.write_report(args.profile)
+    _warn_failed_checks(result)
+    if args.result_json:
+        args.result_json.write_text(result.to_json(indent=2))
+    return result.location
 
     # maybe also ask for single or double reads
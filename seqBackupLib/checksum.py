@@ -0,0 +1,87 @@
+import hashlib
+import os
+from pathlib import Path
+from typing import BinaryIO, Iterator, Optional
+
+from seqBackupLib.throttle import RateLimiter
+
+CHUNK_SIZE = 1024 * 1024  # 1MB
+
+
+def read_chunks(
+    f: BinaryIO, limiter: Optional[RateLimiter] = None, chunk_size: int = CHUNK_SIZE
+) -> Iterator[bytes]:
+    for chunk in iter(lambda: f.read(chunk_size), b""):
+        if limiter is not None:
+            limiter.consume(len(chunk))
+        yield chunk
+
+
+def return_md5(fp: Path, limiter: Optional[RateLimiter] = None) -> str:
+    # from https://stackoverflow.com/questions/3431825/generating-an-md5-checksum-of-a-file
+    hash_md5 = hashlib.md5()
+    with open(fp, "rb") as f:
+        for chunk in read_chunks(f, limiter):
+            hash_md5.update(chunk)
+    return hash_md5.hexdigest()
+
+
+class ChunkHasher:
+    def __init__(self, chunk_size: int):
+        if chunk_size < 1:
+            raise ValueError("Chunk size must be positive", chunk_size)
+        self.chunk_size = chunk_size
+        self.size = 0
+        self._digests = []
+        self._hash = hashlib.md5()
+        self._filled = 0
+
+    def update(self, data: bytes) -> None:
+        # Split whatever the caller read into fixed-size chunks of the file
+        self.size += len(data)
+        view = memoryview(data)
+        while view:
+            n = min(len(view), self.chunk_size - self._filled)
+            self._hash.update(view[:n])
+            self._filled += n
+            view = view[n:]
+            if self._filled == self.chunk_size:
+                self._digests.append(self._hash.digest())
+                self._hash = hashlib.md5()
+                self._filled = 0
+
+    def digests(self) -> list[bytes]:
+        if self._filled:
+            return self._digests + [self._hash.digest()]
+        return list(self._digests)
+
+
+def copy_with_md5(
+    src: Path,
+    dest: Path,
+    limiter: Optional[RateLimiter] = None,
+    chunks: Optional[ChunkHasher] = None,
+) -> str:
+    # Hash the source while copying it so it is only read once
+    hash_md5 = hashlib.md5()
+    with open(src, "rb") as f_in, open(dest, "wb") as f_out:
+        for chunk in read_chunks(f_in, limiter):
+            hash_md5.update(chunk)
+            if chunks is not None:
+                chunks.update(chunk)
+            f_out.write(chunk)
+    return hash_md5.hexdigest()
+
+
+def verify_md5(fp: Path, expected: str, limiter: Optional[RateLimiter] = None) -> None:
+    with open(fp, "rb") as f:
+        # Flush the written copy and drop it from the page cache so the
+        # re-read comes from the disk rather than from memory
+        os.fsync(f.fileno())
+        if hasattr(os, "posix_fadvise"):
+            os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_DONTNEED)
+        hash_md5 = hashlib.md5()
+        for chunk in read_chunks(f, limiter):
+            hash_md5.update(chunk)
+    if hash_md5.hexdigest() != expected:
+        raise IOError("Archived file does not match the source", str(fp), expected)
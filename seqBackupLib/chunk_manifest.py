@@ -0,0 +1,282 @@
+import argparse
+import hashlib
+import os
+import stat
+import struct
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Optional
+
+from seqBackupLib.throttle import RateLimiter, add_bandwidth_argument
+
+MAGIC = b"SBCM"
+FORMAT_VERSION = 1
+DEFAULT_CHUNK_SIZE = 64 * 1024 * 1024  # 64MB
+DEFAULT_THREADS = 8
+DIGEST_SIZE = 16  # md5
+# magic, format version, chunk size, number of files
+HEADER = struct.Struct("<4sHQI")
+# length of the utf-8 file name that follows, file size
+ENTRY = struct.Struct("<HQ")
+
+
+def manifest_name(archive_name: str) -> str:
+    return f"{archive_name}.chunks"
+
+
+def chunk_size_argument(value: str) -> int:
+    try:
+        chunk_size = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Invalid chunk size: {value}")
+    if chunk_size < 1:
+        raise argparse.ArgumentTypeError("Chunk size must be positive")
+    return chunk_size
+
+
+class ChunkManifest:
+    def __init__(self, chunk_size: int = DEFAULT_CHUNK_SIZE):
+        if chunk_size < 1:
+            raise ValueError("Chunk size must be positive", chunk_size)
+        self.chunk_size = chunk_size
+        # file name -> (size, one md5 digest per chunk)
+        self.files = {}
+
+    def n_chunks(self, size: int) -> int:
+        return -(-size // self.chunk_size)
+
+    def chunk_range(self, size: int, index: int) -> tuple[int, int]:
+        offset = index * self.chunk_size
+        return offset, min(self.chunk_size, size - offset)
+
+    def add(self, name: str, size: int, digests: list[bytes]) -> None:
+        if len(digests) != self.n_chunks(size):
+            raise ValueError("Wrong number of chunk digests", name, len(digests))
+        self.files[name] = (size, digests)
+
+    def to_bytes(self) -> bytes:
+        parts = [HEADER.pack(MAGIC, FORMAT_VERSION, self.chunk_size, len(self.files))]
+        for name, (size, digests) in self.files.items():
+            encoded = name.encode("utf-8")
+            parts.append(ENTRY.pack(len(encoded), size))
+            parts.append(encoded)
+            parts.extend(digests)
+        return b"".join(parts)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "ChunkManifest":
+        try:
+            magic, version, chunk_size, n_files = HEADER.unpack_from(data)
+            if magic != MAGIC or version != FORMAT_VERSION:
+                raise ValueError("Not a chunk manifest", magic, version)
+            manifest = cls(chunk_size)
+            pos = HEADER.size
+            for _ in range(n_files):
+                name_length, size = ENTRY.unpack_from(data, pos)
+                pos += ENTRY.size
+                name = data[pos : pos + name_length].decode("utf-8")
+                pos += name_length
+                n_chunks = manifest.n_chunks(size)
+                digests = [
+                    data[pos + i * DIGEST_SIZE : pos + (i + 1) * DIGEST_SIZE]
+                    for i in range(n_chunks)
+                ]
+                pos += n_chunks * DIGEST_SIZE
+                if pos > len(data):
+                    raise struct.error("digests run past the end of the data")
+                manifest.add(name, size, digests)
+        except struct.error as exc:
+            raise ValueError("Truncated chunk manifest", str(exc))
+        if pos != len(data):
+            raise ValueError("Trailing data in chunk manifest", len(data) - pos)
+        return manifest
+
+    def write(self, fp: Path) -> None:
+        fp.write_bytes(self.to_bytes())
+
+    @classmethod
+    def read(cls, fp: Path) -> "ChunkManifest":
+        return cls.from_bytes(fp.read_bytes())
+
+
+def _pread(fd: int, length: int, offset: int) -> bytes:
+    parts = []
+    while length > 0:
+        data = os.pread(fd, length, offset)
+        if not data:
+            break
+        parts.append(data)
+        length -= len(data)
+        offset += len(data)
+    return b"".join(parts)
+
+
+def _pwrite(fd: int, data: bytes, offset: int) -> None:
+    view = memoryview(data)
+    while view:
+        n = os.pwrite(fd, view, offset)
+        view = view[n:]
+        offset += n
+
+
+def _read_chunk(
+    fd: int,
+    manifest: ChunkManifest,
+    size: int,
+    index: int,
+    limiter: Optional[RateLimiter] = None,
+) -> bytes:
+    offset, length = manifest.chunk_range(size, index)
+    data = _pread(fd, length, offset)
+    if limiter is not None:
+        limiter.consume(len(data))
+    return data
+
+
+def verify_archive(
+    archive_dir: Path,
+    threads: int = DEFAULT_THREADS,
+    limiter: Optional[RateLimiter] = None,
+) -> dict[str, list[int]]:
+    # Returns the indices of the damaged chunks of every damaged file
+    manifest = ChunkManifest.read(archive_dir / manifest_name(archive_dir.name))
+    damaged = {}
+    fds = {}
+    try:
+        for name, (size, _) in manifest.files.items():
+            fp = archive_dir / name
+            if not fp.is_file():
+                damaged[name] = list(range(manifest.n_chunks(size)))
+                continue
+            fds[name] = os.open(fp, os.O_RDONLY)
+            # anything past the recorded size is damage in the last chunk
+            if os.fstat(fds[name]).st_size > size and size:
+                damaged[name] = [manifest.n_chunks(size) - 1]
+
+        def check(name: str, index: int) -> bool:
+            size, digests = manifest.files[name]
+            data = _read_chunk(fds[name], manifest, size, index, limiter)
+            return hashlib.md5(data).digest() == digests[index]
+
+        # spread the chunks of every file over one pool of readers
+        chunks = [
+            (name, i)
+            for name in fds
+            for i in range(manifest.n_chunks(manifest.files[name][0]))
+        ]
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            results = pool.map(lambda chunk: check(*chunk), chunks)
+            for (name, i), ok in zip(chunks, results):
+                if not ok and i not in damaged.get(name, []):
+                    damaged.setdefault(name, []).append(i)
+    finally:
+        for fd in fds.values():
+            os.close(fd)
+    return {name: sorted(indices) for name, indices in damaged.items()}
+
+
+def repair_file(
+    fp: Path,
+    secondary_fp: Path,
+    manifest: ChunkManifest,
+    indices: list[int],
+    limiter: Optional[RateLimiter] = None,
+) -> None:
+    # Rewrite only the damaged ranges, each checked against the manifest
+    # before it is written so a bad secondary copy can't make things worse
+    size, digests = manifest.files[fp.name]
+    src_fd = os.open(secondary_fp, os.O_RDONLY)
+    try:
+        chunks = {}
+        for i in indices:
+            chunks[i] = _read_chunk(src_fd, manifest, size, i, limiter)
+            if hashlib.md5(chunks[i]).digest() != digests[i]:
+                raise IOError(
+                    "Secondary copy is also damaged", str(secondary_fp), f"chunk {i}"
+                )
+    finally:
+        os.close(src_fd)
+
+    if fp.exists():
+        fp.chmod(stat.S_IRUSR | stat.S_IWUSR)
+    fd = os.open(fp, os.O_WRONLY | os.O_CREAT, 0o600)
+    try:
+        for i, data in chunks.items():
+            _pwrite(fd, data, manifest.chunk_range(size, i)[0])
+        os.ftruncate(fd, size)
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+        fp.chmod(stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+
+
+def repair_archive(
+    archive_dir: Path,
+    secondary_dir: Path,
+    threads: int = DEFAULT_THREADS,
+    limiter: Optional[RateLimiter] = None,
+) -> dict[str, list[int]]:
+    damaged = verify_archive(archive_dir, threads, limiter)
+    if not damaged:
+        return damaged
+    manifest = ChunkManifest.read(archive_dir / manifest_name(archive_dir.name))
+    for name, indices in damaged.items():
+        repair_file(
+            archive_dir / name, secondary_dir / name, manifest, indices, limiter
+        )
+
+    still_damaged = verify_archive(archive_dir, threads, limiter)
+    if still_damaged:
+        raise IOError("Archive is still damaged after repair", still_damaged)
+    return damaged
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Checks archived lanes against their per-chunk digests"
+    )
+    parser.add_argument(
+        "--archive-dir",
+        required=True,
+        type=Path,
+        nargs="+",
+        help="One or more <run>_L00N archive folders to audit.",
+    )
+    parser.add_argument(
+        "--repair-from",
+        type=Path,
+        help="Archive folder holding a secondary copy to repair damaged chunks from",
+    )
+    parser.add_argument(
+        "--threads",
+        type=int,
+        default=DEFAULT_THREADS,
+        help="Number of chunks to read in parallel",
+    )
+    add_bandwidth_argument(parser)
+    args = parser.parse_args(argv)
+
+    limiter = args.bandwidth_limit
+    # non-zero if any lane is damaged, or couldn't be audited or repaired
+    status = 0
+    for archive_dir in args.archive_dir:
+        try:
+            if args.repair_from:
+                damaged = repair_archive(
+                    archive_dir,
+                    args.repair_from / archive_dir.name,
+                    args.threads,
+                    limiter,
+                )
+            else:
+                damaged = verify_archive(archive_dir, args.threads, limiter)
+        except (OSError, ValueError) as exc:
+            sys.stderr.write(f"{archive_dir.name}\t{exc}\n")
+            status = 1
+            continue
+        for name, indices in damaged.items():
+            print(f"{archive_dir.name}\t{name}\t{','.join(map(str, indices))}")
+        if damaged and not args.repair_from:
+            status = 1
+    return status
@@ -0,0 +1,21 @@
+from functools import lru_cache, wraps
+from pathlib import Path
+from typing import Callable
+
+
+def cached_by_mtime(parse: Callable[[Path], object]) -> Callable[[Path], object]:
+    # Re-parse a file only when its path, modification time or size changes.
+    # The cache lives in the calling process: lanes of a run archived from one
+    # Python process share a parse, but backup_illumina archives one lane per
+    # process and so still parses run-level files once per lane.
+    @lru_cache(maxsize=32)
+    def cached(fp: str, mtime_ns: int, size: int):
+        return parse(Path(fp))
+
+    @wraps(parse)
+    def wrapper(fp: Path):
+        st = fp.stat()
+        return cached(str(fp.resolve()), st.st_mtime_ns, st.st_size)
+
+    wrapper.cache_clear = cached.cache_clear
+    return wrapper
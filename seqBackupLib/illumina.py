@@ -254,3 +254,13 @@ class IlluminaFastq:
 
     def check_index_read_exists(self) -> bool:
         return len(self.fastq_info["index_reads"]) > 2
+
+    def sample_index_reads(self, n_reads: int) -> list[str]:
+        # Continue reading headers from where _parse_header left the stream
+        index_reads = [self.fastq_info["index_reads"]]
+        for i, line in enumerate(self.file):
+            if len(index_reads) >= n_reads:
+                break
+            if i % 4 == 3:
+                index_reads.append(line.strip().rpartition(":")[2])
+        return index_reads
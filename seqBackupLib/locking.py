@@ -0,0 +1,45 @@
+import fcntl
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, Optional
+
+LOCK_DIR = ".seqbackup_locks"
+LOCK_POLICIES = ("wait", "skip")
+LOCK_POLL_INTERVAL = 0.5
+
+
+@contextmanager
+def lane_lock(
+    dest_dir: Path,
+    archive_name: str,
+    policy: str = "wait",
+    timeout: Optional[float] = None,
+) -> Iterator[Path]:
+    # Advisory lock on one archive lane. Linux maps flock to POSIX locks on
+    # NFS, so this also excludes workers on other hosts sharing the archive.
+    if policy not in LOCK_POLICIES:
+        raise ValueError(f"Unknown lock policy: {policy}")
+
+    lock_dir = dest_dir / LOCK_DIR
+    lock_dir.mkdir(parents=True, exist_ok=True)
+    lock_fp = lock_dir / f"{archive_name}.lock"
+
+    with open(lock_fp, "w") as lock:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                break
+            except BlockingIOError:
+                if policy == "skip" or (
+                    deadline is not None and time.monotonic() >= deadline
+                ):
+                    raise BlockingIOError(
+                        "Another backup of this lane is in progress", archive_name
+                    )
+                time.sleep(LOCK_POLL_INTERVAL)
+        try:
+            yield lock_fp
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
@@ -0,0 +1,227 @@
+import argparse
+import os
+import shutil
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Optional
+
+from seqBackupLib.backends import LocalBackend
+from seqBackupLib.backup import ARCHIVE_DIR_REGEX
+from seqBackupLib.checksum import return_md5
+from seqBackupLib.illumina import IlluminaDir
+from seqBackupLib.locking import lane_lock
+from seqBackupLib.restore import read_md5_manifest
+from seqBackupLib.throttle import RateLimiter, add_bandwidth_argument
+
+DEFAULT_MIN_AGE_DAYS = 180
+DEFAULT_THREADS = 4
+MIGRATION_INDEX = "migrated.tsv"
+
+
+def archive_date(archive_name: str) -> date:
+    run_name = ARCHIVE_DIR_REGEX.fullmatch(archive_name).group(1)
+    return date.fromisoformat(IlluminaDir(run_name).folder_info["date"])
+
+
+def find_migratable(
+    hot_root: Path, min_age_days: int, today: Optional[date] = None
+) -> list[Path]:
+    cutoff = (today or date.today()) - timedelta(days=min_age_days)
+    archives = []
+    for archive_dir in sorted(hot_root.iterdir()):
+        # hidden staging directories and stubs of migrated lanes are skipped
+        if archive_dir.name.startswith(".") or archive_dir.is_symlink():
+            continue
+        if not archive_dir.is_dir() or not ARCHIVE_DIR_REGEX.fullmatch(
+            archive_dir.name
+        ):
+            continue
+        try:
+            if archive_date(archive_dir.name) <= cutoff:
+                archives.append(archive_dir)
+        except (ValueError, IndexError):
+            continue
+    return archives
+
+
+def _check_cold_copy(
+    cold_dir: Path,
+    manifest: dict[str, str],
+    threads: int = DEFAULT_THREADS,
+    limiter: Optional[RateLimiter] = None,
+) -> None:
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        md5s = {
+            name: pool.submit(return_md5, cold_dir / name, limiter) for name in manifest
+        }
+        for name, md5 in md5s.items():
+            if md5.result() != manifest[name]:
+                raise IOError(
+                    "Cold copy does not match the manifest", str(cold_dir / name)
+                )
+
+
+def copy_archive(
+    hot_dir: Path,
+    cold_root: Path,
+    threads: int = DEFAULT_THREADS,
+    limiter: Optional[RateLimiter] = None,
+) -> Path:
+    manifest = read_md5_manifest(hot_dir)
+    cold_dir = cold_root / hot_dir.name
+    if cold_dir.is_dir():
+        # published by an earlier, interrupted migration
+        _check_cold_copy(cold_dir, manifest, threads, limiter)
+        return cold_dir
+
+    fastqs = [hot_dir / name for name in manifest]
+    others = [fp for fp in hot_dir.iterdir() if fp.name not in manifest]
+    required = sum(fp.stat().st_size for fp in fastqs + others)
+    backend = LocalBackend(cold_root, verify=True, limiter=limiter)
+    with backend.open_archive(hot_dir.name, required) as archive:
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            copies = {
+                fp.name: pool.submit(archive.put_file, fp, fp.name) for fp in fastqs
+            }
+            for name, copy in copies.items():
+                if copy.result() != manifest[name]:
+                    raise IOError(
+                        "Hot copy does not match the manifest", str(hot_dir / name)
+                    )
+        # the manifest and sample sheet
+        for fp in others:
+            archive.put_bytes(fp.name, fp.read_bytes())
+    return cold_dir
+
+
+def _record_migration(hot_root: Path, archive_name: str, cold_dir: Path) -> None:
+    index_fp = hot_root / MIGRATION_INDEX
+    if index_fp.is_file():
+        with open(index_fp) as f:
+            if any(line.split("\t")[0] == archive_name for line in f):
+                return
+    with open(index_fp, "a") as f:
+        f.write(f"{archive_name}\t{cold_dir}\t{date.today().isoformat()}\n")
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def _retired_dir(hot_dir: Path) -> Path:
+    return hot_dir.parent / f".{hot_dir.name}.migrated"
+
+
+def _recover_retired(hot_dir: Path) -> None:
+    # Finish retiring a lane whose stub was already swapped in, or put back a
+    # lane that was retired before its stub was created. Only call this with
+    # the lane lock held, another migrator may be between the two steps.
+    retired = _retired_dir(hot_dir)
+    if not retired.exists():
+        return
+    if hot_dir.is_symlink():
+        shutil.rmtree(retired)
+    elif not hot_dir.exists():
+        os.rename(retired, hot_dir)
+
+
+def migrate_archive(
+    hot_dir: Path,
+    cold_root: Path,
+    threads: int = DEFAULT_THREADS,
+    limiter: Optional[RateLimiter] = None,
+) -> Path:
+    # Every step can be repeated, so an interrupted migration is finished by
+    # running it again: verified copy, index entry, then swap in the stub.
+    # Raises BlockingIOError if another migrator holds the lane.
+    hot_root = hot_dir.parent
+    with lane_lock(cold_root, hot_dir.name, policy="skip"):
+        _recover_retired(hot_dir)
+        cold_dir = copy_archive(hot_dir, cold_root, threads, limiter)
+        _record_migration(hot_root, hot_dir.name, cold_dir)
+
+        retired = _retired_dir(hot_dir)
+        if hot_dir.is_dir() and not hot_dir.is_symlink():
+            os.rename(hot_dir, retired)
+        if not hot_dir.is_symlink():
+            hot_dir.symlink_to(cold_dir.resolve(), target_is_directory=True)
+        shutil.rmtree(retired, ignore_errors=True)
+    return cold_dir
+
+
+def migrate_archives(
+    hot_root: Path,
+    cold_root: Path,
+    min_age_days: int = DEFAULT_MIN_AGE_DAYS,
+    threads: int = DEFAULT_THREADS,
+    limiter: Optional[RateLimiter] = None,
+    today: Optional[date] = None,
+) -> list[Path]:
+    cold_root.mkdir(parents=True, exist_ok=True)
+    # lanes left retired by an interrupted migration, so they can be found
+    for retired in hot_root.glob(".*.migrated"):
+        hot_dir = hot_root / retired.name[1 : -len(".migrated")]
+        try:
+            with lane_lock(cold_root, hot_dir.name, policy="skip"):
+                _recover_retired(hot_dir)
+        except BlockingIOError:
+            # still being migrated by someone else
+            continue
+
+    migrated = []
+    for hot_dir in find_migratable(hot_root, min_age_days, today):
+        try:
+            migrated.append(migrate_archive(hot_dir, cold_root, threads, limiter))
+        except BlockingIOError:
+            warnings.warn(f"Skipping {hot_dir.name}, another migration holds it")
+    return migrated
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Moves old archived lanes from the hot tier to the cold tier"
+    )
+
+    parser.add_argument(
+        "--hot-dir",
+        required=True,
+        type=Path,
+        help="Archive folder on fast storage holding the <run>_L00N directories.",
+    )
+    parser.add_argument(
+        "--cold-dir",
+        required=True,
+        type=Path,
+        help="Archive folder on the cold tier to move old lanes to.",
+    )
+    parser.add_argument(
+        "--min-age-days",
+        type=int,
+        default=DEFAULT_MIN_AGE_DAYS,
+        help="Migrate lanes whose run date is at least this many days old",
+    )
+    parser.add_argument(
+        "--threads",
+        type=int,
+        default=DEFAULT_THREADS,
+        help="Number of files to copy in parallel for each lane",
+    )
+    add_bandwidth_argument(parser)
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Only list the lanes that would be migrated",
+    )
+    args = parser.parse_args(argv)
+
+    if args.dry_run:
+        for archive_dir in find_migratable(args.hot_dir, args.min_age_days):
+            print(archive_dir.name)
+        return 0
+
+    limiter = args.bandwidth_limit
+    for cold_dir in migrate_archives(
+        args.hot_dir, args.cold_dir, args.min_age_days, args.threads, limiter
+    ):
+        print(cold_dir.name)
+    return 0
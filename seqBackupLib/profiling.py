@@ -0,0 +1,103 @@
+import cProfile
+import io
+import pstats
+import sys
+import time
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+from typing import Iterator, Optional
+
+PROC_IO = "/proc/self/io"
+IO_COUNTERS = ("syscr", "syscw", "rchar", "wchar", "read_bytes", "write_bytes")
+DEFAULT_REPORT_LINES = 30
+
+_active_profilers = []
+_audit_hook_installed = False
+
+
+def _audit_hook(event: str, args: tuple) -> None:
+    if event == "open" and args[0] != PROC_IO:
+        for profiler in _active_profilers:
+            profiler._opens += 1
+
+
+def read_io_counters() -> dict[str, int]:
+    # Linux per-process I/O accounting; syscr/syscw count read/write syscalls
+    try:
+        with open(PROC_IO) as f:
+            counters = dict(line.split(":") for line in f)
+    except OSError:
+        return {}
+    return {k: int(v) for k, v in counters.items() if k in IO_COUNTERS}
+
+
+class Profiler:
+    def __init__(self, use_cprofile: bool = True):
+        global _audit_hook_installed
+        # audit hooks can't be removed, so install one and only count while
+        # a profiler is inside a phase
+        if not _audit_hook_installed:
+            sys.addaudithook(_audit_hook)
+            _audit_hook_installed = True
+        self.phases = []
+        self._opens = 0
+        self._depth = 0
+        self._profile = cProfile.Profile() if use_cprofile else None
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        counters_before = read_io_counters()
+        opens_before = self._opens
+        start = time.perf_counter()
+        if self._depth == 0:
+            _active_profilers.append(self)
+            if self._profile is not None:
+                self._profile.enable()
+        self._depth += 1
+        try:
+            yield
+        finally:
+            self._depth -= 1
+            if self._depth == 0:
+                if self._profile is not None:
+                    self._profile.disable()
+                _active_profilers.remove(self)
+            counters_after = read_io_counters()
+            self.phases.append(
+                {
+                    "phase": name,
+                    "seconds": time.perf_counter() - start,
+                    "opens": self._opens - opens_before,
+                    **{
+                        k: counters_after[k] - counters_before[k]
+                        for k in counters_after
+                        if k in counters_before
+                    },
+                }
+            )
+
+    def report(self, n_lines: int = DEFAULT_REPORT_LINES) -> str:
+        columns = ["phase", "seconds", "opens"] + [
+            k for k in IO_COUNTERS if any(k in p for p in self.phases)
+        ]
+        lines = ["\t".join(columns)]
+        for p in self.phases:
+            values = [p["phase"], f"{p['seconds']:.6f}"]
+            values.extend(str(p.get(k, "")) for k in columns[2:])
+            lines.append("\t".join(values))
+
+        if self._profile is not None:
+            stream = io.StringIO()
+            stats = pstats.Stats(self._profile, stream=stream)
+            stats.sort_stats("cumulative").print_stats(n_lines)
+            lines.extend(["", stream.getvalue()])
+        return "\n".join(lines) + "\n"
+
+    def write_report(self, fp: Path, n_lines: int = DEFAULT_REPORT_LINES) -> None:
+        fp.write_text(self.report(n_lines))
+
+
+def profile_phase(profiler: Optional[Profiler], name: str):
+    if profiler is None:
+        return nullcontext()
+    return profiler.phase(name)
@@ -0,0 +1,180 @@
+import argparse
+import json
+import os
+import sys
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Optional
+
+from seqBackupLib.backup import ARCHIVE_DIR_REGEX
+from seqBackupLib.illumina import IlluminaDir
+
+REPORT_KEYS = ("instrument", "machine_type", "month", "flowcell_id")
+CACHE_NAME = ".seqbackup_report_cache.json"
+DEFAULT_THREADS = 16
+
+
+def scan_archive(archive_dir: str) -> dict:
+    # one scandir per lane; the manifest tells us which entries are fastq files
+    name = os.path.basename(archive_dir)
+    md5_name = f"{name}.md5"
+    total_bytes = 0
+    fastq_bytes = 0
+    n_fastqs = 0
+    sizes = {}
+    with os.scandir(archive_dir) as entries:
+        for entry in entries:
+            if entry.is_file(follow_symlinks=False):
+                sizes[entry.name] = entry.stat(follow_symlinks=False).st_size
+                total_bytes += sizes[entry.name]
+    if md5_name in sizes:
+        with open(os.path.join(archive_dir, md5_name)) as f:
+            for line in f:
+                fastq = line.split("\t")[0]
+                if fastq in sizes:
+                    fastq_bytes += sizes[fastq]
+                    n_fastqs += 1
+
+    run_name = ARCHIVE_DIR_REGEX.fullmatch(name).group(1)
+    try:
+        run = IlluminaDir(run_name)
+        info = {
+            "instrument": run.folder_info["instrument"],
+            "machine_type": run.machine_type,
+            "month": run.folder_info["date"][:7],
+            "flowcell_id": run.folder_info["flowcell_id"],
+        }
+    except (ValueError, IndexError):
+        info = {key: "unknown" for key in REPORT_KEYS}
+
+    info.update(
+        {
+            "bytes": total_bytes,
+            "fastq_bytes": fastq_bytes,
+            "fastq_files": n_fastqs,
+        }
+    )
+    return info
+
+
+def load_cache(cache_fp: Optional[Path]) -> dict:
+    if cache_fp is None or not cache_fp.is_file():
+        return {}
+    with open(cache_fp) as f:
+        return json.load(f)
+
+
+def save_cache(cache_fp: Optional[Path], cache: dict) -> None:
+    if cache_fp is None:
+        return
+    tmp_fp = cache_fp.with_name(cache_fp.name + ".tmp")
+    # the archive may well be mounted read-only; the report is still good
+    try:
+        with open(tmp_fp, "w") as f:
+            json.dump(cache, f)
+        tmp_fp.replace(cache_fp)
+    except OSError as exc:
+        warnings.warn(f"Not caching lane usage in {cache_fp}: {exc}")
+        try:
+            tmp_fp.unlink(missing_ok=True)
+        except OSError:
+            pass
+
+
+def collect_archives(
+    archive_root: Path,
+    cache_fp: Optional[Path] = None,
+    threads: int = DEFAULT_THREADS,
+) -> dict[str, dict]:
+    # Archived lanes are never modified after they are published, so a lane
+    # whose directory mtime is unchanged is taken from the cache unscanned
+    cache = load_cache(cache_fp)
+    archives = {}
+    to_scan = {}
+    with os.scandir(archive_root) as entries:
+        for entry in entries:
+            if entry.name.startswith(".") or not entry.is_dir(follow_symlinks=False):
+                continue
+            if not ARCHIVE_DIR_REGEX.fullmatch(entry.name):
+                continue
+            mtime_ns = entry.stat(follow_symlinks=False).st_mtime_ns
+            cached = cache.get(entry.name)
+            if cached is not None and cached["mtime_ns"] == mtime_ns:
+                archives[entry.name] = cached
+            else:
+                to_scan[entry.name] = (entry.path, mtime_ns)
+
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        scans = {
+            name: pool.submit(scan_archive, path) for name, (path, _) in to_scan.items()
+        }
+        for name, scan in scans.items():
+            archives[name] = dict(scan.result(), mtime_ns=to_scan[name][1])
+
+    save_cache(cache_fp, archives)
+    return archives
+
+
+def aggregate(archives: dict[str, dict], key: str) -> dict[str, dict]:
+    totals = {}
+    for stats in archives.values():
+        total = totals.setdefault(
+            stats[key], {"lanes": 0, "fastq_files": 0, "fastq_bytes": 0, "bytes": 0}
+        )
+        total["lanes"] += 1
+        total["fastq_files"] += stats["fastq_files"]
+        total["fastq_bytes"] += stats["fastq_bytes"]
+        total["bytes"] += stats["bytes"]
+    return dict(sorted(totals.items()))
+
+
+def format_report(totals: dict[str, dict], key: str) -> str:
+    columns = ["lanes", "fastq_files", "fastq_bytes", "bytes"]
+    lines = ["\t".join([key] + columns)]
+    for value, total in totals.items():
+        lines.append("\t".join([value] + [str(total[c]) for c in columns]))
+    return "\n".join(lines) + "\n"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Reports archive storage usage")
+
+    parser.add_argument(
+        "--archive-dir",
+        required=True,
+        type=Path,
+        help="Archive folder holding the <run>_L00N directories.",
+    )
+    parser.add_argument(
+        "--by",
+        nargs="+",
+        choices=REPORT_KEYS,
+        default=list(REPORT_KEYS),
+        help="Fields to aggregate usage by",
+    )
+    parser.add_argument(
+        "--cache",
+        type=Path,
+        help=f"Cache of per-lane usage (default <archive-dir>/{CACHE_NAME})",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Scan every lane without reading or writing the cache",
+    )
+    parser.add_argument(
+        "--threads",
+        type=int,
+        default=DEFAULT_THREADS,
+        help="Number of lane directories to scan in parallel",
+    )
+    args = parser.parse_args(argv)
+
+    cache_fp = None
+    if not args.no_cache:
+        cache_fp = args.cache or args.archive_dir / CACHE_NAME
+    archives = collect_archives(args.archive_dir, cache_fp, args.threads)
+    reports = {key: aggregate(archives, key) for key in args.by}
+    sys.stdout.write("\n".join(format_report(reports[key], key) for key in args.by))
+    return 0
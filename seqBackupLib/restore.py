@@ -0,0 +1,177 @@
+import argparse
+import re
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Optional
+
+from seqBackupLib.backup import ARCHIVE_DIR_REGEX
+from seqBackupLib.checksum import copy_with_md5, return_md5
+from seqBackupLib.chunk_manifest import manifest_name
+from seqBackupLib.throttle import RateLimiter, add_bandwidth_argument
+
+READ_LABELS = ("R1", "R2", "I1", "I2")
+DEFAULT_THREADS = 4
+
+
+def read_md5_manifest(archive_dir: Path) -> dict[str, str]:
+    md5_fp = archive_dir / f"{archive_dir.name}.md5"
+    with open(md5_fp) as f:
+        return dict(line.rstrip("\n").split("\t") for line in f if line.strip())
+
+
+def find_sample_sheets(archive_dir: Path, manifest: dict[str, str]) -> list[Path]:
+    # whatever the lane holds besides its fastqs and manifests, under the
+    # name the sample sheet was archived with
+    manifests = {f"{archive_dir.name}.md5", manifest_name(archive_dir.name)}
+    return [
+        fp
+        for fp in sorted(archive_dir.iterdir())
+        if fp.is_file()
+        and not fp.name.startswith(".")
+        and fp.name not in manifest
+        and fp.name not in manifests
+    ]
+
+
+def read_label(filename: str) -> str:
+    if matches := re.search("_([RI][12])_001.fastq.gz$", filename):
+        return matches.group(1)
+    raise ValueError(f"Unexpected FASTQ file name: {filename}")
+
+
+def find_archives(
+    archive_root: Path,
+    runs: Optional[list[str]] = None,
+    lanes: Optional[list[str]] = None,
+) -> list[Path]:
+    archives = []
+    for archive_dir in sorted(archive_root.iterdir()):
+        # skip staging directories and anything else that isn't <run>_L00N
+        matches = ARCHIVE_DIR_REGEX.fullmatch(archive_dir.name)
+        if archive_dir.name.startswith(".") or not matches:
+            continue
+        if not archive_dir.is_dir():
+            continue
+        run, lane = matches.group(1), str(int(matches.group(2)))
+        if runs and run not in runs:
+            continue
+        if lanes and lane not in lanes:
+            continue
+        archives.append(archive_dir)
+    return archives
+
+
+def restore_file(
+    src: Path, dest: Path, expected: str, limiter: Optional[RateLimiter] = None
+) -> Path:
+    # copy to a temporary name and only move it into place once the digest
+    # computed while streaming matches the manifest
+    partial = dest.with_name(f".{dest.name}.partial")
+    md5 = copy_with_md5(src, partial, limiter)
+    if md5 != expected:
+        partial.unlink()
+        raise IOError("Restored file does not match the manifest", str(src), expected)
+    partial.replace(dest)
+    return dest
+
+
+def restore_archives(
+    archive_root: Path,
+    dest_dir: Path,
+    runs: Optional[list[str]] = None,
+    lanes: Optional[list[str]] = None,
+    reads: tuple[str, ...] = READ_LABELS,
+    threads: int = DEFAULT_THREADS,
+    limiter: Optional[RateLimiter] = None,
+) -> list[Path]:
+    archives = find_archives(archive_root, runs, lanes)
+    if not archives:
+        raise IOError("No archived lanes match the selection", str(archive_root))
+
+    jobs = []
+    extra_jobs = []
+    manifests = []
+    for archive_dir in archives:
+        write_dir = dest_dir / archive_dir.name
+        write_dir.mkdir(parents=True, exist_ok=True)
+        manifest = read_md5_manifest(archive_dir)
+        restored = {
+            name: md5 for name, md5 in manifest.items() if read_label(name) in reads
+        }
+        for name, md5 in restored.items():
+            jobs.append((archive_dir / name, write_dir / name, md5))
+        # the sample sheet isn't in the manifest, so check the copy against
+        # the archived file itself
+        for fp in find_sample_sheets(archive_dir, manifest):
+            extra_jobs.append((fp, write_dir / fp.name, return_md5(fp, limiter)))
+
+        manifests.append((write_dir / f"{archive_dir.name}.md5", restored))
+
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        restores = [
+            pool.submit(restore_file, src, dest, md5, limiter)
+            for src, dest, md5 in jobs + extra_jobs
+        ]
+        restored_fps = [restore.result() for restore in restores][: len(jobs)]
+
+    # the manifest, limited to the files restored, so the working copy can be
+    # checked again later. Only written once every file is in place.
+    for md5_fp, restored in manifests:
+        partial = md5_fp.with_name(f".{md5_fp.name}.partial")
+        partial.write_text("".join(f"{n}\t{md5}\n" for n, md5 in restored.items()))
+        partial.replace(md5_fp)
+    return restored_fps
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Restores archived fastq files")
+
+    parser.add_argument(
+        "--archive-dir",
+        required=True,
+        type=Path,
+        help="Archive folder holding the <run>_L00N directories.",
+    )
+    parser.add_argument(
+        "--destination-dir",
+        required=True,
+        type=Path,
+        help="Working folder to restore the files to.",
+    )
+    parser.add_argument(
+        "--run",
+        action="append",
+        help="Run name to restore (can be given multiple times, default all)",
+    )
+    parser.add_argument(
+        "--lane",
+        action="append",
+        type=lambda lane: str(int(lane)),
+        help="Lane number to restore (can be given multiple times, default all)",
+    )
+    parser.add_argument(
+        "--reads",
+        nargs="+",
+        choices=READ_LABELS,
+        default=list(READ_LABELS),
+        help="Reads to restore, e.g. --reads R1 R2 to skip the index reads",
+    )
+    parser.add_argument(
+        "--threads",
+        type=int,
+        default=DEFAULT_THREADS,
+        help="Number of files to restore in parallel",
+    )
+    add_bandwidth_argument(parser)
+    args = parser.parse_args(argv)
+    limiter = args.bandwidth_limit
+    restore_archives(
+        args.archive_dir,
+        args.destination_dir,
+        args.run,
+        args.lane,
+        tuple(args.reads),
+        args.threads,
+        limiter,
+    )
+    return 0
@@ -0,0 +1,52 @@
+import json
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Optional, Union
+
+
+@dataclass
+class CheckResult:
+    name: str
+    passed: bool
+    message: str
+    details: Any = None
+
+
+@dataclass
+class FileResult:
+    name: str
+    source: str
+    size: int
+    md5: str
+    seconds: float
+
+
+@dataclass
+class BackupResult:
+    archive_name: str
+    location: Union[Path, str]
+    files: list[FileResult] = field(default_factory=list)
+    checks: list[CheckResult] = field(default_factory=list)
+    seconds: float = 0.0
+    run_info: Optional[dict] = None
+
+    @property
+    def passed(self) -> bool:
+        return all(check.passed for check in self.checks)
+
+    @property
+    def failed_checks(self) -> list[CheckResult]:
+        return [check for check in self.checks if not check.passed]
+
+    @property
+    def md5s(self) -> dict[str, str]:
+        return {f.name: f.md5 for f in self.files}
+
+    def to_dict(self) -> dict:
+        result = asdict(self)
+        result["location"] = str(self.location)
+        result["passed"] = self.passed
+        return result
+
+    def to_json(self, **kwargs) -> str:
+        return json.dumps(self.to_dict(), **kwargs)
@@ -0,0 +1,114 @@
+import warnings
+import xml.etree.ElementTree as ET
+from pathlib import Path
+from typing import Optional
+
+from seqBackupLib.file_cache import cached_by_mtime
+
+RUN_INFO_NAME = "RunInfo.xml"
+RUN_PARAMETERS_NAMES = ("RunParameters.xml", "runParameters.xml")
+RUN_PARAMETERS_TAGS = (
+    "ApplicationName",
+    "Application",
+    "InstrumentType",
+    "ExperimentName",
+    "RTAVersion",
+    "RtaVersion",
+)
+# How far FASTQs can sit below the run folder; the deepest is NovaSeq X
+# onboard output in <run>/Analysis/<n>/Data/fastq/
+MAX_RUN_DIR_DEPTH = 5
+
+
+class RunInfo:
+    def __init__(
+        self,
+        run_id: str,
+        lane_count: int,
+        reads: list[dict],
+        parameters: Optional[dict[str, str]] = None,
+    ):
+        self.run_id = run_id
+        self.lane_count = lane_count
+        self.reads = reads
+        self.parameters = parameters or {}
+
+    @property
+    def index_read_count(self) -> int:
+        return sum(read["is_index"] for read in self.reads)
+
+    def to_dict(self) -> dict:
+        return {
+            "run_id": self.run_id,
+            "lane_count": self.lane_count,
+            "reads": self.reads,
+            "parameters": self.parameters,
+        }
+
+
+def _parse_run_parameters(fp: Path) -> dict[str, str]:
+    parameters = {}
+    for _, elem in ET.iterparse(fp, events=("end",)):
+        if elem.tag in RUN_PARAMETERS_TAGS and elem.text and elem.text.strip():
+            parameters.setdefault(elem.tag, elem.text.strip())
+        elem.clear()
+    return parameters
+
+
+@cached_by_mtime
+def parse_run_info(fp: Path) -> RunInfo:
+    run_id = ""
+    lane_count = 1
+    reads = []
+    for _, elem in ET.iterparse(fp, events=("end",)):
+        if elem.tag == "Run":
+            run_id = elem.get("Id", "")
+        elif elem.tag == "Read":
+            reads.append(
+                {
+                    "number": int(elem.get("Number")),
+                    "cycles": int(elem.get("NumCycles")),
+                    "is_index": elem.get("IsIndexedRead") == "Y",
+                }
+            )
+        elif elem.tag == "FlowcellLayout":
+            lane_count = int(elem.get("LaneCount", 1))
+        # Run is the parent of everything, so only clear leaf elements
+        if elem.tag != "Run":
+            elem.clear()
+    reads.sort(key=lambda read: read["number"])
+
+    parameters = {}
+    for name in RUN_PARAMETERS_NAMES:
+        parameters_fp = fp.parent / name
+        if parameters_fp.is_file():
+            try:
+                parameters = _parse_run_parameters(parameters_fp)
+            except ET.ParseError as exc:
+                warnings.warn(f"Ignoring unreadable {parameters_fp}: {exc}")
+            break
+    return RunInfo(run_id, lane_count, reads, parameters)
+
+
+def find_run_info(fastq_fp: Path, run_name: Optional[str] = None) -> Optional[RunInfo]:
+    # Search no higher than the run folder, and skip files describing another
+    # run, which would otherwise decide which index reads get archived
+    for parent in list(fastq_fp.parents)[:MAX_RUN_DIR_DEPTH]:
+        run_info_fp = parent / RUN_INFO_NAME
+        if run_info_fp.is_file():
+            # the metadata is optional, so a broken or half-written file only
+            # costs us the extra checks
+            try:
+                run_info = parse_run_info(run_info_fp)
+            except (ET.ParseError, TypeError, ValueError) as exc:
+                warnings.warn(f"Ignoring unreadable {run_info_fp}: {exc}")
+                return None
+            if run_name is None or run_info.run_id == run_name:
+                return run_info
+            warnings.warn(
+                f"Ignoring {run_info_fp}: it describes run {run_info.run_id}, "
+                f"not {run_name}"
+            )
+        if parent.name == run_name:
+            break
+    return None
@@ -0,0 +1,110 @@
+import csv
+from pathlib import Path
+
+from seqBackupLib.file_cache import cached_by_mtime
+from seqBackupLib.illumina import IlluminaFastq
+
+DEFAULT_INDEX_SAMPLE_SIZE = 1000
+DEFAULT_MIN_INDEX_MATCH_FRACTION = 0.05
+
+# Column names for the lane and index sequences in the v1 ([Data]) and
+# v2 ([BCLConvert_Data]) sample sheet formats, lowercased
+DATA_SECTIONS = {1: "data", 2: "bclconvert_data"}
+INDEX1_COLUMNS = ("index",)
+INDEX2_COLUMNS = ("index2",)
+LANE_COLUMNS = ("lane",)
+
+
+def reverse_complement(seq: str) -> str:
+    return seq[::-1].translate(str.maketrans("ACGTN", "TGCAN"))
+
+
+class SampleSheet:
+    def __init__(self, version: int, samples: list[dict[str, str]]):
+        self.version = version
+        self.samples = samples
+
+    def _column(self, names: tuple[str, ...]) -> list[str]:
+        values = []
+        for sample in self.samples:
+            value = next((sample[n] for n in names if sample.get(n)), "")
+            values.append(value.strip().upper())
+        return values
+
+    @property
+    def lanes(self) -> set[str]:
+        return {lane for lane in self._column(LANE_COLUMNS) if lane}
+
+    @property
+    def indexes(self) -> set[tuple[str, str]]:
+        return set(zip(self._column(INDEX1_COLUMNS), self._column(INDEX2_COLUMNS)))
+
+
+def _split_sections(lines: list[str]) -> dict[str, list[str]]:
+    sections = {}
+    current = None
+    for line in lines:
+        stripped = line.strip()
+        if stripped.startswith("[") and "]" in stripped:
+            current = stripped[1 : stripped.index("]")].lower()
+            sections[current] = []
+        elif current is not None and stripped.strip(","):
+            sections[current].append(stripped)
+    return sections
+
+
+@cached_by_mtime
+def parse_sample_sheet(fp: Path) -> SampleSheet:
+    with open(fp, newline="") as f:
+        sections = _split_sections(f.read().splitlines())
+
+    header = dict((row + [""])[:2] for row in csv.reader(sections.get("header", [])))
+    version = 2 if header.get("FileFormatVersion", "").strip() == "2" else 1
+    if version == 1 and "bclconvert_data" in sections:
+        version = 2
+
+    rows = list(csv.reader(sections.get(DATA_SECTIONS[version], [])))
+    if not rows:
+        return SampleSheet(version, [])
+    columns = [c.strip().lower() for c in rows[0]]
+    return SampleSheet(version, [dict(zip(columns, row)) for row in rows[1:]])
+
+
+def _index_matches(observed: str, expected: tuple[str, str]) -> bool:
+    index1, _, index2 = observed.upper().partition("+")
+    expected1, expected2 = expected
+    if not index1.startswith(expected1):
+        return False
+    if not expected2 or not index2:
+        return True
+    # Depending on the instrument, i5 is read in either orientation
+    return index2.startswith(expected2) or index2.startswith(
+        reverse_complement(expected2)
+    )
+
+
+def check_sample_sheet(
+    sheet: SampleSheet,
+    fastq: IlluminaFastq,
+    n_reads: int = DEFAULT_INDEX_SAMPLE_SIZE,
+    min_match_fraction: float = DEFAULT_MIN_INDEX_MATCH_FRACTION,
+) -> list:
+    samples_check = len(sheet.samples) > 0
+    lane_check = not sheet.lanes or fastq.lane in sheet.lanes
+
+    indexes = {index for index in sheet.indexes if index[0]}
+    if indexes:
+        observed = fastq.sample_index_reads(n_reads)
+        matched = sum(any(_index_matches(o, e) for e in indexes) for o in observed)
+        match_fraction = matched / len(observed)
+    else:
+        match_fraction = 1.0
+    index_check = match_fraction >= min_match_fraction
+
+    return [
+        samples_check and lane_check and index_check,
+        samples_check,
+        lane_check,
+        index_check,
+        match_fraction,
+    ]
@@ -0,0 +1,145 @@
+import fcntl
+import os
+import socket
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, Optional
+
+RESERVATION_DIR = ".seqbackup_reservations"
+# backups run by other users of the group write here too; setgid keeps the
+# group on everything created inside
+RESERVATION_DIR_MODE = 0o2775
+RESERVATION_LOCK_MODE = 0o664
+
+
+def available_space(dest_dir: Path) -> int:
+    # f_bavail only leaves out the blocks reserved for root; user and group
+    # quotas are not checked
+    st = os.statvfs(dest_dir)
+    return st.f_bavail * st.f_frsize
+
+
+def reservation_dir(dest_dir: Path, shared_dir: Optional[Path] = None) -> Path:
+    # Archive roots that share a volume only see each other's in-flight bytes
+    # when they are given the same shared_dir
+    return (shared_dir or dest_dir) / RESERVATION_DIR
+
+
+def _make_reservation_dir(fp: Path) -> None:
+    try:
+        fp.mkdir(parents=True)
+    except FileExistsError:
+        return
+    # mkdir applies the umask
+    fp.chmod(RESERVATION_DIR_MODE)
+
+
+def _open_lock(fp: Path) -> int:
+    # NFS turns flock into POSIX locks, which need the file open for writing
+    try:
+        fd = os.open(fp, os.O_RDWR | os.O_CREAT | os.O_EXCL, RESERVATION_LOCK_MODE)
+    except FileExistsError:
+        return os.open(fp, os.O_RDWR)
+    os.fchmod(fd, RESERVATION_LOCK_MODE)
+    return fd
+
+
+def _pid_is_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _read_reservation(fp: Path) -> tuple[str, int, int]:
+    host, pid, nbytes = fp.read_text().strip().split("\t")
+    return host, int(pid), int(nbytes)
+
+
+def reserved_space(dest_dir: Path, shared_dir: Optional[Path] = None) -> int:
+    # Sum the bytes still owed to in-flight archives, pruning reservations
+    # left behind by dead processes on this host
+    total = 0
+    hostname = socket.gethostname()
+    for fp in reservation_dir(dest_dir, shared_dir).glob("*.reserve"):
+        try:
+            host, pid, nbytes = _read_reservation(fp)
+        except (FileNotFoundError, ValueError):
+            continue
+        if host == hostname and not _pid_is_alive(pid):
+            try:
+                fp.unlink(missing_ok=True)
+            except PermissionError:
+                pass
+            continue
+        total += nbytes
+    return total
+
+
+class SpaceReservation:
+    def __init__(self, fp: Path, nbytes: int):
+        self.fp = fp
+        self.remaining = nbytes
+        self._lock = threading.Lock()
+        self._write()
+
+    def _write(self) -> None:
+        # replace the file in one step so readers never see it half written
+        tmp_fp = self.fp.with_name(f".{self.fp.name}.tmp")
+        tmp_fp.write_text(
+            "\t".join([socket.gethostname(), str(os.getpid()), str(self.remaining)])
+            + "\n"
+        )
+        os.replace(tmp_fp, self.fp)
+
+    def consume(self, nbytes: int) -> None:
+        # Bytes that have landed on disk are already counted as used by the
+        # filesystem, so stop holding them in the reservation
+        with self._lock:
+            self.remaining = max(self.remaining - nbytes, 0)
+            self._write()
+
+    def release(self) -> None:
+        self.fp.unlink(missing_ok=True)
+
+
+@contextmanager
+def reserve_space(
+    dest_dir: Path,
+    archive_name: str,
+    nbytes: int,
+    shared_dir: Optional[Path] = None,
+) -> Iterator[SpaceReservation]:
+    reservations = reservation_dir(dest_dir, shared_dir)
+    _make_reservation_dir(reservations)
+
+    lock = _open_lock(reservations / ".lock")
+    try:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            free = available_space(dest_dir) - reserved_space(dest_dir, shared_dir)
+            if free < nbytes:
+                raise IOError(
+                    "Not enough free space at destination",
+                    str(dest_dir),
+                    f"required: {nbytes}",
+                    f"available: {free}",
+                )
+            reservation = SpaceReservation(
+                reservations
+                / f"{archive_name}.{socket.gethostname()}.{os.getpid()}.reserve",
+                nbytes,
+            )
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+    finally:
+        os.close(lock)
+
+    try:
+        yield reservation
+    finally:
+        reservation.release()
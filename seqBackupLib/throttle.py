@@ -0,0 +1,142 @@
+import argparse
+import ctypes
+import os
+import platform
+import re
+import sys
+import threading
+import time
+import warnings
+from datetime import datetime
+from datetime import time as dtime
+from typing import Callable
+
+RATE_UNITS = {"": 1, "K": 1024, "M": 1024**2, "G": 1024**3}
+# Linux ioprio_set(2), which glibc doesn't wrap
+IO_PRIORITY_CLASSES = {"best-effort": 2, "idle": 3}
+IOPRIO_CLASS_SHIFT = 13
+IOPRIO_WHO_PROCESS = 1
+SYS_IOPRIO_SET = {
+    "x86_64": 251,
+    "aarch64": 30,
+    "ppc64le": 273,
+    "i686": 289,
+    "armv7l": 314,
+}
+
+
+def parse_rate(value: str) -> int:
+    # Bytes per second, e.g. "500K", "50M", "1G"; 0 means unlimited
+    matches = re.fullmatch(r"(\d+)([KMG]?)", value.strip().upper())
+    if matches is None:
+        raise ValueError(f"Invalid bandwidth rate: {value}")
+    return int(matches.group(1)) * RATE_UNITS[matches.group(2)]
+
+
+def parse_bandwidth_schedule(value: str) -> list[tuple[dtime, dtime, int]]:
+    # Either a single rate applied all day ("50M") or comma separated windows
+    # of allowed bandwidth by time of day ("08:00-18:00=20M,18:00-08:00=0")
+    if "=" not in value:
+        return [(dtime(0, 0), dtime(0, 0), parse_rate(value))]
+
+    schedule = []
+    for window in value.split(","):
+        matches = re.fullmatch(
+            r"(\d{1,2}):(\d{2})-(\d{1,2}):(\d{2})=(\w+)", window.strip()
+        )
+        if matches is None:
+            raise ValueError(f"Invalid bandwidth window: {window}")
+        h1, m1, h2, m2, rate = matches.groups()
+        schedule.append(
+            (dtime(int(h1), int(m1)), dtime(int(h2), int(m2)), parse_rate(rate))
+        )
+    return schedule
+
+
+def _in_window(start: dtime, end: dtime, now: dtime) -> bool:
+    if start == end:
+        return True
+    if start < end:
+        return start <= now < end
+    return now >= start or now < end
+
+
+class RateLimiter:
+    def __init__(
+        self,
+        schedule: list[tuple[dtime, dtime, int]],
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+        now: Callable[[], datetime] = datetime.now,
+    ):
+        self.schedule = schedule
+        self._clock = clock
+        self._sleep = sleep
+        self._now = now
+        self._lock = threading.Lock()
+        self._tokens = 0.0
+        self._last = clock()
+
+    @classmethod
+    def from_string(cls, value: str) -> "RateLimiter":
+        return cls(parse_bandwidth_schedule(value))
+
+    def rate(self) -> int:
+        now = self._now().time()
+        for start, end, rate in self.schedule:
+            if _in_window(start, end, now):
+                return rate
+        return 0
+
+    def consume(self, nbytes: int) -> None:
+        # Token bucket holding at most one second of traffic. Callers that
+        # overdraw it go into debt and sleep until it is paid back, so threads
+        # sharing a limiter are throttled as a group.
+        with self._lock:
+            now = self._clock()
+            rate = self.rate()
+            if not rate:
+                self._tokens = 0.0
+                self._last = now
+                return
+            self._tokens = min(rate, self._tokens + (now - self._last) * rate)
+            self._last = now
+            self._tokens -= nbytes
+            wait = -self._tokens / rate if self._tokens < 0 else 0.0
+        if wait:
+            self._sleep(wait)
+
+
+def _bandwidth_limit(value: str) -> RateLimiter:
+    try:
+        return RateLimiter.from_string(value)
+    except ValueError as exc:
+        raise argparse.ArgumentTypeError(str(exc))
+
+
+def add_bandwidth_argument(parser: argparse.ArgumentParser) -> None:
+    # shared by every command that reads archived or source files
+    parser.add_argument(
+        "--bandwidth-limit",
+        type=_bandwidth_limit,
+        help=(
+            "Maximum read rate in bytes per second (e.g. 50M), or a schedule of"
+            " rates by time of day (e.g. 08:00-18:00=20M,18:00-08:00=0)."
+            " 0 means unlimited"
+        ),
+    )
+
+
+def set_io_priority(io_class: str, level: int = 7) -> None:
+    # CPU niceness doesn't reach the multi-queue I/O schedulers, so set the
+    # I/O priority itself; BFQ honours it, mq-deadline and none ignore it
+    syscall_number = SYS_IOPRIO_SET.get(platform.machine())
+    if not sys.platform.startswith("linux") or syscall_number is None:
+        warnings.warn(f"Can't set the I/O priority on {platform.machine()}")
+        return
+    data = level if io_class == "best-effort" else 0
+    ioprio = (IO_PRIORITY_CLASSES[io_class] << IOPRIO_CLASS_SHIFT) | data
+    libc = ctypes.CDLL(None, use_errno=True)
+    if libc.syscall(syscall_number, IOPRIO_WHO_PROCESS, 0, ioprio) != 0:
+        errno = ctypes.get_errno()
+        raise OSError(errno, os.strerror(errno))
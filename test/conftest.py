@@ -2,6 +2,8 @@ import gzip
 import pytest
 from pathlib import Path
 
+from seqBackupLib.backup import archive_fastq
+
 
 def setup_illumina_dir(fp: Path, r1: str, r1_lines: list[str]) -> Path:
     fp.mkdir(parents=True, exist_ok=True)
@@ -249,3 +251,22 @@ def full_miseq_dir(tmp_path) -> Path:
             "1>1111>100>0\n",
         ],
     )
+
+
+@pytest.fixture
+def archived_lanes(full_miseq_dir):
+    # Backs up lanes of full_miseq_dir into dest_dir, one result per lane
+    def archive(dest_dir: Path, lanes=("1", "2"), **kwargs) -> list:
+        return [
+            archive_fastq(
+                full_miseq_dir / f"Undetermined_S0_L00{lane}_R1_001.fastq.gz",
+                dest_dir,
+                full_miseq_dir / "sample_sheet.csv",
+                True,
+                100,
+                **kwargs,
+            )
+            for lane in lanes
+        ]
+
+    return archive
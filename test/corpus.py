@@ -0,0 +1,149 @@
+import argparse
+import random
+import string
+import sys
+from typing import Iterator, Optional
+
+from seqBackupLib.illumina import MACHINE_TYPES, extract_instrument_code
+
+# Instruments whose run folder prefixes the flowcell id with its position
+POSITION_PREFIXED = {"D", "A", "NB", "LH", "SH"}
+READ_LABELS = ("R1", "R2", "I1", "I2")
+INDEX_BASES = "ACGTN"
+
+
+def machine_codes() -> list[str]:
+    # codes with digits can't be told apart from the instrument serial
+    return sorted(c for c in MACHINE_TYPES if extract_instrument_code(c) == c)
+
+
+def _random_date(rng: random.Random) -> tuple[str, str]:
+    year = rng.randint(2010, 2039)
+    month = rng.randint(1, 12)
+    day = rng.randint(1, 28)
+    iso = f"{year}-{month:02}-{day:02}"
+    if rng.random() < 0.5:
+        return f"{year % 100:02}{month:02}{day:02}", iso
+    return f"{year}{month:02}{day:02}", iso
+
+
+def _random_flowcell(rng: random.Random, code: str) -> str:
+    if code == "M":
+        suffix = "".join(rng.choices(string.ascii_uppercase + string.digits, k=5))
+        return f"000000000-{suffix}"
+    alphabet = string.ascii_uppercase + string.digits
+    return "".join(rng.choices(alphabet, k=rng.randint(8, 12)))
+
+
+def random_run(rng: random.Random, code: Optional[str] = None) -> dict[str, str]:
+    code = code or rng.choice(machine_codes())
+    date, iso = _random_date(rng)
+    instrument = f"{code}{rng.randint(0, 99999):05}"
+    run_number = rng.randint(1, 9999)
+    flowcell_id = _random_flowcell(rng, code)
+    folder_flowcell = flowcell_id
+    if code in POSITION_PREFIXED:
+        folder_flowcell = rng.choice("AB") + flowcell_id
+    return {
+        "run_name": "_".join([date, instrument, f"{run_number:04}", folder_flowcell]),
+        "date": iso,
+        "instrument": instrument,
+        "run_number": str(run_number),
+        "flowcell_id": flowcell_id,
+        "machine_type": MACHINE_TYPES[code],
+    }
+
+
+def invalid_run_name(rng: random.Random) -> str:
+    date, _, run_number, flowcell = random_run(rng)["run_name"].split("_")
+    instrument = f"{rng.choice(machine_codes())}{rng.randint(0, 99999):05}"
+    mutation = rng.randrange(4)
+    if mutation == 0:
+        date = (date * 2)[: rng.choice([4, 5, 7, 9])]
+    elif mutation == 1:
+        code = "".join(rng.choices(string.ascii_uppercase, k=rng.randint(1, 3)))
+        while code in MACHINE_TYPES:
+            code += rng.choice(string.ascii_uppercase)
+        instrument = f"{code}{rng.randint(0, 99999):05}"
+    elif mutation == 2:
+        run_number = run_number[:2] + rng.choice(string.ascii_uppercase)
+    else:
+        flowcell = f"{flowcell}_{rng.choice(['extra', 'copy', '1'])}"
+    return "_".join([date, instrument, run_number, flowcell])
+
+
+def fastq_filename(rng: random.Random, lane: int, label: str) -> str:
+    if rng.random() < 0.1:
+        return f"Undetermined_S0_{label}_001.fastq.gz"
+    return f"Undetermined_S0_L{lane:03}_{label}_001.fastq.gz"
+
+
+def invalid_fastq_filename(rng: random.Random) -> str:
+    mutation = rng.randrange(4)
+    if mutation == 0:
+        return f"Undetermined_S0_L{rng.choice([0, 9, 10, 81]):03}_R1_001.fastq.gz"
+    if mutation == 1:
+        return f"Undetermined_S0_L001_{rng.choice(['R3', 'I3', 'X1'])}_001.fastq.gz"
+    if mutation == 2:
+        return f"Sample_S{rng.randint(1, 96)}_L001_R1_001.fastq.gz"
+    return f"Undetermined_S0_L001_R1_001.{rng.choice(['fq.gz', 'txt', 'bam'])}"
+
+
+def fastq_header(rng: random.Random, run: dict[str, str], lane: int, read: str) -> str:
+    index_reads = "+".join(
+        "".join(rng.choices(INDEX_BASES, k=rng.choice([8, 10, 12])))
+        for _ in range(rng.randint(1, 2))
+    )
+    return "@{}:{}:{}:{}:{}:{}:{} {}:{}:0:{}\n".format(
+        run["instrument"],
+        run["run_number"],
+        run["flowcell_id"],
+        lane,
+        rng.randint(1101, 2628),
+        rng.randint(1000, 32000),
+        rng.randint(1000, 32000),
+        read,
+        rng.choice("NY"),
+        index_reads,
+    )
+
+
+def generate_corpus(n: int, seed: int = 0) -> Iterator[dict]:
+    # Deterministic for a given seed so failures can be replayed
+    rng = random.Random(seed)
+    codes = machine_codes()
+    for i in range(n):
+        run = random_run(rng, codes[i % len(codes)])
+        lane = rng.randint(1, 8)
+        label = rng.choice(READ_LABELS)
+        yield {
+            **run,
+            "lane": str(lane),
+            "read_or_index": label[0],
+            "read": label[1],
+            "filename": fastq_filename(rng, lane, label),
+            "header": fastq_header(rng, run, lane, label[1]),
+            "invalid_run_name": invalid_run_name(rng),
+            "invalid_filename": invalid_fastq_filename(rng),
+        }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Writes a randomized corpus of run names, FASTQ file names "
+        "and headers as TSV"
+    )
+    parser.add_argument("--n", type=int, default=1000, help="Number of records")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed")
+    args = parser.parse_args(argv)
+
+    keys = None
+    for record in generate_corpus(args.n, args.seed):
+        if keys is None:
+            keys = list(record)
+            sys.stdout.write("\t".join(keys) + "\n")
+        sys.stdout.write("\t".join(record[k].strip() for k in keys) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,238 @@
+import hashlib
+import os
+
+import pytest
+
+import seqBackupLib.backends as backends
+from seqBackupLib.backends import (
+    MAX_BUFFER_SIZE,
+    MIN_PART_SIZE,
+    LocalBackend,
+    S3Backend,
+    choose_concurrency,
+    choose_part_size,
+)
+from seqBackupLib.backup import backup_fastq
+from seqBackupLib.checksum import return_md5
+from seqBackupLib.space import RESERVATION_DIR
+
+MB = 1024 * 1024
+
+
+class FakeS3Client:
+    # Minimal in-memory stand-in for the boto3 S3 client calls we use
+    def __init__(self, corrupt: bool = False):
+        self.objects = {}
+        self.uploads = {}
+        self.aborted = []
+        self.corrupt = corrupt
+
+    def _etag(self, body: bytes) -> str:
+        if self.corrupt:
+            body = body + b"x"
+        return '"' + hashlib.md5(body).hexdigest() + '"'
+
+    def head_object(self, Bucket, Key):
+        if (Bucket, Key) not in self.objects:
+            error = Exception("Not Found")
+            error.response = {"Error": {"Code": "404"}}
+            raise error
+        return {"ContentLength": len(self.objects[(Bucket, Key)])}
+
+    def put_object(self, Bucket, Key, Body, ContentMD5):
+        self.objects[(Bucket, Key)] = Body
+        return {"ETag": self._etag(Body)}
+
+    def create_multipart_upload(self, Bucket, Key):
+        upload_id = str(len(self.uploads))
+        self.uploads[upload_id] = {}
+        return {"UploadId": upload_id}
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body, ContentMD5):
+        self.uploads[UploadId][PartNumber] = Body
+        return {"ETag": self._etag(Body)}
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload):
+        parts = self.uploads.pop(UploadId)
+        self.objects[(Bucket, Key)] = b"".join(
+            parts[part["PartNumber"]] for part in MultipartUpload["Parts"]
+        )
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId):
+        self.uploads.pop(UploadId)
+        self.aborted.append(Key)
+
+
+def test_local_archive_is_published_atomically(tmp_path):
+    src = tmp_path / "src.txt"
+    src.write_text("Hello, World!")
+    dest_dir = tmp_path / "raw_reads"
+    backend = LocalBackend(dest_dir)
+
+    with backend.open_archive("run_L001", 13) as archive:
+        archive.put_file(src, "src.txt")
+        archive.put_bytes(
+            "run_L001.md5", b"src.txt\t65a8e27d8879283831b664bd8b7f0ad4\n"
+        )
+        # readers only ever see the hidden staging directory
+        assert not (dest_dir / "run_L001").exists()
+        assert archive.staging_dir.parent == dest_dir
+        assert archive.staging_dir.name.startswith(".")
+
+    assert archive.location == dest_dir / "run_L001"
+    assert sorted(p.name for p in archive.location.iterdir()) == [
+        "run_L001.md5",
+        "src.txt",
+    ]
+    assert not archive.staging_dir.exists()
+
+    with pytest.raises(FileExistsError):
+        with backend.open_archive("run_L001", 13):
+            pass
+
+
+def test_local_archive_failure_leaves_nothing_behind(tmp_path):
+    src = tmp_path / "src.txt"
+    src.write_text("Hello, World!")
+    dest_dir = tmp_path / "raw_reads"
+
+    with pytest.raises(RuntimeError):
+        with LocalBackend(dest_dir).open_archive("run_L001", 13) as archive:
+            archive.put_file(src, "src.txt")
+            raise RuntimeError("crash")
+
+    assert [p.name for p in dest_dir.iterdir()] == [RESERVATION_DIR]
+    assert list((dest_dir / RESERVATION_DIR).glob("*.reserve")) == []
+
+
+def test_local_archive_removes_stale_staging(tmp_path):
+    src = tmp_path / "src.txt"
+    src.write_text("Hello, World!")
+    dest_dir = tmp_path / "raw_reads"
+    # left behind by a backup that was killed
+    stale = dest_dir / ".run_L001.tmp.1"
+    stale.mkdir(parents=True)
+    (stale / "src.txt").write_text("partial")
+
+    with LocalBackend(dest_dir).open_archive("run_L001", 13) as archive:
+        archive.put_file(src, "src.txt")
+
+    assert sorted(p.name for p in dest_dir.iterdir()) == [
+        RESERVATION_DIR,
+        "run_L001",
+    ]
+
+
+def test_choose_part_size():
+    assert choose_part_size(0) == MIN_PART_SIZE
+    assert choose_part_size(100 * MB) == MIN_PART_SIZE
+    assert choose_part_size(90 * 1024 * MB) == 93 * MB
+
+
+def test_choose_concurrency():
+    assert choose_concurrency(3 * MB, MIN_PART_SIZE, 8) == 1
+    assert choose_concurrency(100 * MB, MIN_PART_SIZE, 8) == 8
+    assert choose_concurrency(10 * 1024 * MB, MAX_BUFFER_SIZE, 8) == 1
+
+
+def test_s3_multipart_upload(tmp_path, monkeypatch):
+    monkeypatch.setattr(backends, "MIN_PART_SIZE", MB)
+    src = tmp_path / "big.bin"
+    src.write_bytes(os.urandom(3 * MB + 10))
+    client = FakeS3Client()
+    backend = S3Backend(client, "bucket", "archive/", verify=True)
+
+    with backend.open_archive("run_L001", src.stat().st_size) as archive:
+        md5 = archive.put_file(src, "big.bin")
+        assert archive.location == "s3://bucket/archive/run_L001"
+
+    assert md5 == return_md5(src)
+    assert client.objects[("bucket", "archive/run_L001/big.bin")] == src.read_bytes()
+
+
+def test_s3_upload_detects_corruption(tmp_path, monkeypatch):
+    monkeypatch.setattr(backends, "MIN_PART_SIZE", MB)
+    src = tmp_path / "big.bin"
+    src.write_bytes(os.urandom(2 * MB + 10))
+    client = FakeS3Client(corrupt=True)
+    backend = S3Backend(client, "bucket", verify=True)
+
+    with backend.open_archive("run_L001", src.stat().st_size) as archive:
+        with pytest.raises(IOError, match="does not match the source"):
+            archive.put_file(src, "big.bin")
+    assert client.aborted == ["run_L001/big.bin"]
+    assert not client.objects
+
+
+def test_s3_upload_stops_at_failed_part(tmp_path, monkeypatch):
+    monkeypatch.setattr(backends, "MIN_PART_SIZE", MB)
+    src = tmp_path / "big.bin"
+    src.write_bytes(os.urandom(20 * MB))
+    client = FakeS3Client()
+    attempts = []
+
+    def upload_part(**kwargs):
+        attempts.append(kwargs["PartNumber"])
+        raise IOError("connection reset")
+
+    client.upload_part = upload_part
+    backend = S3Backend(client, "bucket", max_workers=1)
+
+    with backend.open_archive("run_L001", src.stat().st_size) as archive:
+        with pytest.raises(IOError, match="connection reset"):
+            archive.put_file(src, "big.bin")
+    assert attempts == [1]
+    assert client.aborted == ["run_L001/big.bin"]
+
+
+def test_backup_fastq_to_s3(tmp_path, full_miseq_dir):
+    client = FakeS3Client()
+    location = backup_fastq(
+        full_miseq_dir / "Undetermined_S0_L001_R1_001.fastq.gz",
+        None,
+        full_miseq_dir / "sample_sheet.csv",
+        True,
+        100,
+        backend=S3Backend(client, "bucket", "raw_reads"),
+    )
+
+    archive_name = "250407_M03543_0443_000000000-DTHBL_L001"
+    assert location == f"s3://bucket/raw_reads/{archive_name}"
+    md5s = client.objects[("bucket", f"raw_reads/{archive_name}/{archive_name}.md5")]
+    for line in md5s.decode().splitlines():
+        name, md5 = line.split("\t")
+        assert md5 == return_md5(full_miseq_dir / name)
+        key = ("bucket", f"raw_reads/{archive_name}/{name}")
+        assert client.objects[key] == (full_miseq_dir / name).read_bytes()
+    assert ("bucket", f"raw_reads/{archive_name}/sample_sheet.csv") in client.objects
+
+
+def test_s3_backend_refuses_existing_archive(tmp_path, full_miseq_dir):
+    client = FakeS3Client()
+    backend = S3Backend(client, "bucket", "raw_reads")
+    args = (
+        full_miseq_dir / "Undetermined_S0_L001_R1_001.fastq.gz",
+        None,
+        full_miseq_dir / "sample_sheet.csv",
+        True,
+        100,
+    )
+    backup_fastq(*args, backend=backend)
+    objects = dict(client.objects)
+
+    with pytest.raises(FileExistsError):
+        backup_fastq(*args, backend=backend)
+    assert client.objects == objects
+
+
+def test_backend_settings_are_not_ignored(tmp_path, full_miseq_dir):
+    with pytest.raises(ValueError, match="set on the backend"):
+        backup_fastq(
+            full_miseq_dir / "Undetermined_S0_L001_R1_001.fastq.gz",
+            None,
+            full_miseq_dir / "sample_sheet.csv",
+            True,
+            100,
+            verify=True,
+            backend=S3Backend(FakeS3Client(), "bucket"),
+        )
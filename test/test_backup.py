@@ -1,7 +1,16 @@
 import pytest
 from pathlib import Path
 import gzip
-from seqBackupLib.backup import backup_fastq, build_fp_to_archive, return_md5, main
+import json
+from seqBackupLib.backup import (
+    archive_fastq,
+    backup_fastq,
+    build_fp_to_archive,
+    copy_with_md5,
+    main,
+    return_md5,
+    verify_md5,
+)
 
 
 def _write_fastq(fp: Path, header: str) -> None:
@@ -61,6 +70,21 @@ def test_return_md5(tmp_path):
     assert md5_hash == "65a8e27d8879283831b664bd8b7f0ad4"  # MD5 hash of "Hello, World!"
 
 
+def test_copy_and_verify_md5(tmp_path):
+    src = tmp_path / "src.txt"
+    src.write_text("Hello, World!")
+    dest = tmp_path / "dest.txt"
+
+    md5_hash = copy_with_md5(src, dest)
+    assert md5_hash == "65a8e27d8879283831b664bd8b7f0ad4"
+    assert dest.read_text() == "Hello, World!"
+    verify_md5(dest, md5_hash)
+
+    dest.write_text("Hello, World?")
+    with pytest.raises(IOError, match="does not match the source"):
+        verify_md5(dest, md5_hash)
+
+
 def test_backup_fastq(tmp_path, full_miseq_dir):
     raw = tmp_path / "raw_reads"
     raw.mkdir(parents=True, exist_ok=True)
@@ -81,6 +105,21 @@ def test_backup_fastq(tmp_path, full_miseq_dir):
         100,
     )
 
+    out_dir = backup_fastq(
+        full_miseq_dir / "Undetermined_S0_L002_R1_001.fastq.gz",
+        tmp_path / "verified_reads",
+        sample_sheet_fp,
+        True,
+        100,
+        verify=True,
+    )
+    md5s = dict(
+        line.split("\t")
+        for line in (out_dir / f"{out_dir.name}.md5").read_text().splitlines()
+    )
+    for name, md5 in md5s.items():
+        assert return_md5(out_dir / name) == md5
+
     with pytest.raises(FileNotFoundError):
         backup_fastq(
             full_miseq_dir / "Undetermined_S0_L003_R1_001.fastq.gz",
@@ -179,3 +218,63 @@ def test_allow_check_failures_continues_archive(tmp_path):
     assert out_dir.is_dir()
     md5_fp = out_dir / f"{out_dir.name}.md5"
     assert md5_fp.is_file()
+
+
+def test_archive_fastq_returns_result(tmp_path, full_miseq_dir):
+    raw = tmp_path / "raw_reads"
+    result = archive_fastq(
+        full_miseq_dir / "Undetermined_S0_L001_R1_001.fastq.gz",
+        raw,
+        full_miseq_dir / "sample_sheet.csv",
+        True,
+        100,
+    )
+
+    assert result.archive_name == "250407_M03543_0443_000000000-DTHBL_L001"
+    assert result.location == raw / result.archive_name
+    assert result.passed
+    assert [c.name for c in result.checks] == [
+        "fp_vs_content",
+        "file_size",
+        "index_reads",
+        "same_run",
+    ]
+    assert [f.name for f in result.files] == [
+        "Undetermined_S0_L001_R1_001.fastq.gz",
+        "Undetermined_S0_L001_R2_001.fastq.gz",
+        "Undetermined_S0_L001_I1_001.fastq.gz",
+        "Undetermined_S0_L001_I2_001.fastq.gz",
+    ]
+    for f in result.files:
+        assert f.size == (full_miseq_dir / f.name).stat().st_size
+        assert f.md5 == return_md5(full_miseq_dir / f.name)
+
+    serialised = json.loads(result.to_json())
+    assert serialised["location"] == str(raw / result.archive_name)
+    assert serialised["files"][0]["md5"] == result.files[0].md5
+
+
+def test_main_writes_result_json(tmp_path, full_miseq_dir):
+    result_fp = tmp_path / "result.json"
+    with pytest.warns(UserWarning, match="suspiciously small"):
+        main(
+            [
+                "--forward-reads",
+                str(full_miseq_dir / "Undetermined_S0_L001_R1_001.fastq.gz"),
+                "--destination-dir",
+                str(tmp_path / "raw_reads"),
+                "--sample-sheet",
+                str(full_miseq_dir / "sample_sheet.csv"),
+                "--min-file-size",
+                "1000000",
+                "--allow-check-failures",
+                "--result-json",
+                str(result_fp),
+            ]
+        )
+
+    result = json.loads(result_fp.read_text())
+    assert not result["passed"]
+    failed = [c for c in result["checks"] if not c["passed"]]
+    assert [c["name"] for c in failed] == ["file_size"]
+    assert failed[0]["details"] == [False, False, False, False]
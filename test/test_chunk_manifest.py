@@ -0,0 +1,198 @@
+import hashlib
+import os
+import stat
+
+import pytest
+
+import seqBackupLib.backends as backends
+from seqBackupLib.backends import S3Backend
+from seqBackupLib.backup import archive_fastq, main
+from seqBackupLib.checksum import ChunkHasher, return_md5
+from seqBackupLib.chunk_manifest import main as audit_main
+from seqBackupLib.chunk_manifest import (
+    ChunkManifest,
+    manifest_name,
+    repair_archive,
+    verify_archive,
+)
+from .test_backends import MB, FakeS3Client
+
+ARCHIVE_NAME = "250407_M03543_0443_000000000-DTHBL_L001"
+CHUNK_SIZE = 64
+
+
+def test_chunk_hasher():
+    data = os.urandom(10 * 1000 + 7)
+    hasher = ChunkHasher(1000)
+    # feed it pieces that don't line up with the chunks
+    for i in range(0, len(data), 333):
+        hasher.update(data[i : i + 333])
+
+    assert hasher.size == len(data)
+    assert hasher.digests() == [
+        hashlib.md5(data[i : i + 1000]).digest() for i in range(0, len(data), 1000)
+    ]
+
+    for chunk_size in [0, -1]:
+        with pytest.raises(ValueError, match="must be positive"):
+            ChunkHasher(chunk_size)
+        with pytest.raises(ValueError, match="must be positive"):
+            ChunkManifest(chunk_size)
+
+
+def test_manifest_round_trip():
+    manifest = ChunkManifest(1000)
+    manifest.add("a.fastq.gz", 2500, [b"a" * 16, b"b" * 16, b"c" * 16])
+    manifest.add("empty.fastq.gz", 0, [])
+    data = manifest.to_bytes()
+
+    parsed = ChunkManifest.from_bytes(data)
+    assert parsed.chunk_size == 1000
+    assert parsed.files == manifest.files
+    assert parsed.chunk_range(2500, 2) == (2000, 500)
+
+    with pytest.raises(ValueError):
+        manifest.add("b.fastq.gz", 2500, [b"a" * 16])
+    with pytest.raises(ValueError, match="Truncated"):
+        ChunkManifest.from_bytes(data[:-1])
+    with pytest.raises(ValueError, match="Not a chunk manifest"):
+        ChunkManifest.from_bytes(b"XXXX" + data[4:])
+
+
+def _damage(fp, offset):
+    fp.chmod(stat.S_IRUSR | stat.S_IWUSR)
+    with open(fp, "r+b") as f:
+        f.seek(offset)
+        byte = f.read(1)
+        f.seek(offset)
+        f.write(bytes([byte[0] ^ 0xFF]))
+
+
+def test_verify_and_repair_archive(tmp_path, archived_lanes):
+    (result,) = archived_lanes(tmp_path / "primary", ["1"], chunk_size=CHUNK_SIZE)
+    archived_lanes(tmp_path / "secondary", ["1"], chunk_size=CHUNK_SIZE)
+    primary = result.location
+    secondary = tmp_path / "secondary" / ARCHIVE_NAME
+
+    manifest = ChunkManifest.read(primary / manifest_name(ARCHIVE_NAME))
+    assert manifest.chunk_size == CHUNK_SIZE
+    assert sorted(manifest.files) == sorted(result.md5s)
+    assert verify_archive(primary) == {}
+
+    r1 = "Undetermined_S0_L001_R1_001.fastq.gz"
+    i2 = "Undetermined_S0_L001_I2_001.fastq.gz"
+    _damage(primary / r1, CHUNK_SIZE + 3)
+    (primary / i2).unlink()
+    damaged = verify_archive(primary, threads=2)
+    assert damaged == {
+        r1: [1],
+        i2: list(range(manifest.n_chunks(manifest.files[i2][0]))),
+    }
+
+    assert repair_archive(primary, secondary) == damaged
+    assert verify_archive(primary) == {}
+    for name, md5 in result.md5s.items():
+        assert return_md5(primary / name) == md5
+    assert stat.S_IMODE((primary / r1).stat().st_mode) == 0o444
+
+    # a secondary copy with the same damage can't be used
+    _damage(primary / r1, 5)
+    _damage(secondary / r1, 5)
+    with pytest.raises(IOError, match="also damaged"):
+        repair_archive(primary, secondary)
+
+
+def test_audit_exit_status(tmp_path, archived_lanes, capsys):
+    (result,) = archived_lanes(tmp_path / "primary", ["1"], chunk_size=CHUNK_SIZE)
+    archived_lanes(tmp_path / "secondary", ["1"], chunk_size=CHUNK_SIZE)
+    primary = str(result.location)
+    secondary = str(tmp_path / "secondary")
+
+    assert audit_main(["--archive-dir", primary]) == 0
+    assert capsys.readouterr().out == ""
+
+    r1 = "Undetermined_S0_L001_R1_001.fastq.gz"
+    _damage(result.location / r1, 3)
+    assert audit_main(["--archive-dir", primary]) == 1
+    assert capsys.readouterr().out == f"{ARCHIVE_NAME}\t{r1}\t0\n"
+
+    # repaired lanes are healthy again
+    assert audit_main(["--archive-dir", primary, "--repair-from", secondary]) == 0
+    assert audit_main(["--archive-dir", primary]) == 0
+
+    _damage(result.location / r1, 3)
+    _damage(tmp_path / "secondary" / ARCHIVE_NAME / r1, 3)
+    assert audit_main(["--archive-dir", primary, "--repair-from", secondary]) == 1
+    assert "also damaged" in capsys.readouterr().err
+
+
+def test_main_writes_chunk_manifest(tmp_path, full_miseq_dir):
+    out_dir = main(
+        [
+            "--forward-reads",
+            str(full_miseq_dir / "Undetermined_S0_L001_R1_001.fastq.gz"),
+            "--destination-dir",
+            str(tmp_path / "raw_reads"),
+            "--sample-sheet",
+            str(full_miseq_dir / "sample_sheet.csv"),
+            "--min-file-size",
+            "100",
+            "--chunk-manifest",
+        ]
+    )
+    manifest = ChunkManifest.read(out_dir / manifest_name(ARCHIVE_NAME))
+    assert manifest.chunk_size == 64 * MB
+
+
+@pytest.mark.parametrize("chunk_size", ["0", "-1", "64M"])
+def test_main_rejects_bad_chunk_size(tmp_path, full_miseq_dir, chunk_size):
+    with pytest.raises(SystemExit):
+        main(
+            [
+                "--forward-reads",
+                str(full_miseq_dir / "Undetermined_S0_L001_R1_001.fastq.gz"),
+                "--destination-dir",
+                str(tmp_path / "raw_reads"),
+                "--sample-sheet",
+                str(full_miseq_dir / "sample_sheet.csv"),
+                "--chunk-manifest",
+                chunk_size,
+            ]
+        )
+    assert not (tmp_path / "raw_reads").exists()
+
+
+def test_s3_chunk_manifest(tmp_path, monkeypatch, full_miseq_dir):
+    monkeypatch.setattr(backends, "MIN_PART_SIZE", MB)
+    src = tmp_path / "big.bin"
+    src.write_bytes(os.urandom(3 * MB + 10))
+    client = FakeS3Client()
+    backend = S3Backend(client, "bucket", chunk_size=MB)
+
+    # multipart
+    with backend.open_archive("run_L001", src.stat().st_size) as archive:
+        archive.put_file(src, "big.bin")
+    size, digests = archive.chunk_manifest.files["big.bin"]
+    data = src.read_bytes()
+    assert size == len(data)
+    assert digests == [
+        hashlib.md5(data[i : i + MB]).digest() for i in range(0, len(data), MB)
+    ]
+
+    # single put, written next to the md5 manifest
+    archive_fastq(
+        full_miseq_dir / "Undetermined_S0_L001_R1_001.fastq.gz",
+        None,
+        full_miseq_dir / "sample_sheet.csv",
+        True,
+        100,
+        backend=backend,
+    )
+    manifest_key = ("bucket", f"{ARCHIVE_NAME}/{manifest_name(ARCHIVE_NAME)}")
+    manifest = ChunkManifest.from_bytes(client.objects[manifest_key])
+    assert len(manifest.files) == 4
+    # the md5 manifest marks a finished lane, so it has to come last
+    assert list(client.objects)[-2:] == [
+        manifest_key,
+        ("bucket", f"{ARCHIVE_NAME}/{ARCHIVE_NAME}.md5"),
+    ]
@@ -0,0 +1,105 @@
+import io
+import os
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from seqBackupLib.illumina import MACHINE_TYPES, IlluminaDir, IlluminaFastq
+from .corpus import generate_corpus, machine_codes
+
+# Set SEQBACKUP_CORPUS_SIZE to fuzz more inputs and SEQBACKUP_SCALE to the
+# number of inputs to time each parser on, e.g. SEQBACKUP_SCALE=1000000
+CORPUS_SIZE = int(os.environ.get("SEQBACKUP_CORPUS_SIZE", 2000))
+CORPUS_SEED = int(os.environ.get("SEQBACKUP_CORPUS_SEED", 0))
+SCALE = int(os.environ.get("SEQBACKUP_SCALE", 0))
+SCALE_POOL_SIZE = 10000
+
+
+@pytest.fixture(scope="module")
+def corpus() -> list[dict]:
+    return list(generate_corpus(CORPUS_SIZE, CORPUS_SEED))
+
+
+def _open_fastq(record: dict, filename: str) -> io.StringIO:
+    f = io.StringIO(record["header"] + "ACGT\n+\nIIII\n")
+    f.name = f"/sequencing/{record['run_name']}/{filename}"
+    return f
+
+
+def test_corpus_covers_machine_types(corpus):
+    machine_types = {record["machine_type"] for record in corpus}
+    assert machine_types == {MACHINE_TYPES[code] for code in machine_codes()}
+
+
+def test_corpus_is_reproducible():
+    assert list(generate_corpus(50, seed=7)) == list(generate_corpus(50, seed=7))
+    assert list(generate_corpus(50, seed=7)) != list(generate_corpus(50, seed=8))
+
+
+def test_run_names_round_trip(corpus):
+    for record in corpus:
+        d = IlluminaDir(record["run_name"])
+        assert d.machine_type == record["machine_type"], record["run_name"]
+        assert d.folder_info == {
+            k: record[k] for k in ("date", "instrument", "run_number", "flowcell_id")
+        }, record["run_name"]
+
+
+def test_invalid_run_names_rejected(corpus):
+    for record in corpus:
+        with pytest.raises(ValueError):
+            IlluminaDir(record["invalid_run_name"])
+
+
+def test_fastqs_round_trip(corpus):
+    for record in corpus:
+        fastq = IlluminaFastq(_open_fastq(record, record["filename"]))
+        assert fastq.check_fp_vs_content()[0], record["header"]
+        assert fastq.run_name == record["run_name"]
+        assert fastq.lane == record["lane"]
+        assert fastq.folder_info["read_or_index"] == record["read_or_index"]
+        assert fastq.build_archive_dir() == f"{record['run_name']}_L00{record['lane']}"
+
+
+def test_invalid_fastqs_rejected(corpus):
+    for record in corpus:
+        with pytest.raises(ValueError):
+            IlluminaFastq(_open_fastq(record, record["invalid_filename"]))
+
+        f = _open_fastq(record, record["filename"])
+        f.seek(1)
+        with pytest.raises(ValueError, match="Not a FASTQ header"):
+            IlluminaFastq(f)
+
+
+def _throughput(parse, inputs: list, n: int) -> float:
+    start = time.perf_counter()
+    for i in range(n):
+        parse(inputs[i % len(inputs)])
+    return n / (time.perf_counter() - start)
+
+
+@pytest.mark.skipif(not SCALE, reason="set SEQBACKUP_SCALE to run")
+def test_parser_throughput(capsys):
+    pool = list(generate_corpus(min(SCALE, SCALE_POOL_SIZE), CORPUS_SEED))
+    fastq = IlluminaFastq.__new__(IlluminaFastq)
+    fastq.fastq_info = {"lane": "1"}
+
+    def parse_header(record):
+        fastq.file = iter([record["header"]])
+        return fastq._parse_header()
+
+    def parse_fastq_file(record):
+        fastq.file = SimpleNamespace(name=record["filename"])
+        return fastq._parse_fastq_file()
+
+    rates = {
+        "IlluminaDir": _throughput(lambda r: IlluminaDir(r["run_name"]), pool, SCALE),
+        "_parse_header": _throughput(parse_header, pool, SCALE),
+        "_parse_fastq_file": _throughput(parse_fastq_file, pool, SCALE),
+    }
+    with capsys.disabled():
+        for name, rate in rates.items():
+            print(f"\n{name}\t{SCALE} inputs\t{rate:,.0f}/s", end="")
+        print()
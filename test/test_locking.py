@@ -0,0 +1,91 @@
+import pytest
+
+from seqBackupLib.backends import S3Backend
+from seqBackupLib.backup import backup_fastq, main
+from seqBackupLib.locking import LOCK_DIR, lane_lock
+
+ARCHIVE_NAME = "250407_M03543_0443_000000000-DTHBL_L001"
+
+
+def test_lane_lock_policies(tmp_path):
+    with lane_lock(tmp_path, "run_L001") as lock_fp:
+        assert lock_fp == tmp_path / LOCK_DIR / "run_L001.lock"
+
+        with pytest.raises(BlockingIOError, match="in progress"):
+            with lane_lock(tmp_path, "run_L001", policy="skip"):
+                pass
+        with pytest.raises(BlockingIOError, match="in progress"):
+            with lane_lock(tmp_path, "run_L001", timeout=0):
+                pass
+
+        # other lanes are unaffected
+        with lane_lock(tmp_path, "run_L002", policy="skip"):
+            pass
+
+    with lane_lock(tmp_path, "run_L001", policy="skip"):
+        pass
+
+    with pytest.raises(ValueError):
+        with lane_lock(tmp_path, "run_L001", policy="steal"):
+            pass
+
+
+def test_backup_fastq_rejects_locked_lane_before_validation(tmp_path, full_miseq_dir):
+    raw = tmp_path / "raw_reads"
+    # validation would fail on the missing R2 if it got that far
+    (full_miseq_dir / "Undetermined_S0_L001_R2_001.fastq.gz").unlink()
+
+    with lane_lock(raw, ARCHIVE_NAME):
+        with pytest.raises(BlockingIOError):
+            backup_fastq(
+                full_miseq_dir / "Undetermined_S0_L001_R1_001.fastq.gz",
+                raw,
+                full_miseq_dir / "sample_sheet.csv",
+                True,
+                100,
+                lock_policy="skip",
+            )
+
+    (raw / ARCHIVE_NAME).mkdir()
+    with pytest.raises(FileExistsError):
+        backup_fastq(
+            full_miseq_dir / "Undetermined_S0_L001_R1_001.fastq.gz",
+            raw,
+            full_miseq_dir / "sample_sheet.csv",
+            True,
+            100,
+        )
+
+
+def test_main_locks_s3_lanes_through_lock_dir(tmp_path, full_miseq_dir, monkeypatch):
+    from .test_backends import FakeS3Client
+
+    client = FakeS3Client()
+    monkeypatch.setattr(
+        S3Backend,
+        "from_url",
+        classmethod(lambda cls, url, endpoint_url=None, **kw: cls(client, "b", **kw)),
+    )
+    argv = [
+        "--forward-reads",
+        str(full_miseq_dir / "Undetermined_S0_L001_R1_001.fastq.gz"),
+        "--destination-dir",
+        "s3://b",
+        "--sample-sheet",
+        str(full_miseq_dir / "sample_sheet.csv"),
+        "--min-file-size",
+        "100",
+        "--lock-policy",
+        "skip",
+    ]
+    # lock options that would be ignored are rejected
+    with pytest.raises(SystemExit):
+        main(argv)
+    with pytest.raises(SystemExit):
+        main(argv[:6] + ["--destination-dir", str(tmp_path), "--lock-dir", "x"])
+
+    lock_dir = tmp_path / "locks"
+    with lane_lock(lock_dir, ARCHIVE_NAME):
+        with pytest.raises(BlockingIOError):
+            main(argv + ["--lock-dir", str(lock_dir)])
+    assert main(argv + ["--lock-dir", str(lock_dir)]) == f"s3://b/{ARCHIVE_NAME}"
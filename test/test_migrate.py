@@ -0,0 +1,133 @@
+from datetime import date
+
+import pytest
+
+from seqBackupLib.checksum import return_md5
+from seqBackupLib.migrate import (
+    MIGRATION_INDEX,
+    archive_date,
+    copy_archive,
+    find_migratable,
+    main,
+    migrate_archives,
+)
+from seqBackupLib.locking import lane_lock
+from seqBackupLib.restore import read_md5_manifest
+from seqBackupLib.throttle import RateLimiter, parse_bandwidth_schedule
+
+ARCHIVE_NAME = "250407_M03543_0443_000000000-DTHBL_L001"
+TODAY = date(2026, 1, 1)
+
+
+class RecordingLimiter(RateLimiter):
+    def __init__(self):
+        super().__init__(parse_bandwidth_schedule("0"))
+        self.consumed = []
+
+    def consume(self, nbytes: int) -> None:
+        self.consumed.append(nbytes)
+
+
+def test_find_migratable(tmp_path, archived_lanes):
+    hot = tmp_path / "hot"
+    archived_lanes(hot, lanes=["1"])
+
+    assert archive_date(ARCHIVE_NAME) == date(2025, 4, 7)
+    assert find_migratable(hot, 180, TODAY) == [hot / ARCHIVE_NAME]
+    assert find_migratable(hot, 365, TODAY) == []
+
+
+def test_migrate_archives(tmp_path, archived_lanes):
+    hot = tmp_path / "hot"
+    cold = tmp_path / "cold"
+    hot_dir = archived_lanes(hot, lanes=["1"])[0].location
+    manifest = read_md5_manifest(hot_dir)
+
+    assert migrate_archives(hot, cold, 180, today=TODAY) == [cold / ARCHIVE_NAME]
+
+    cold_dir = cold / ARCHIVE_NAME
+    assert read_md5_manifest(cold_dir) == manifest
+    for name, md5 in manifest.items():
+        assert return_md5(cold_dir / name) == md5
+    assert (cold_dir / "sample_sheet.csv").is_file()
+
+    # the hot tier keeps a stub pointing at the cold copy and an index entry
+    assert hot_dir.is_symlink()
+    assert hot_dir.resolve() == cold_dir.resolve()
+    assert (
+        (hot / MIGRATION_INDEX).read_text().startswith(f"{ARCHIVE_NAME}\t{cold_dir}\t")
+    )
+    assert sorted(p.name for p in hot.iterdir() if not p.name.startswith(".")) == [
+        ARCHIVE_NAME,
+        MIGRATION_INDEX,
+    ]
+
+    # nothing left to do on a second pass
+    assert migrate_archives(hot, cold, 180, today=TODAY) == []
+
+
+def test_migration_resumes_after_interruption(tmp_path, archived_lanes):
+    hot = tmp_path / "hot"
+    cold = tmp_path / "cold"
+    hot_dir = archived_lanes(hot, lanes=["1"])[0].location
+    cold.mkdir()
+
+    # crashed after publishing the cold copy, with a stale staging directory
+    copy_archive(hot_dir, cold)
+    (cold / f".{ARCHIVE_NAME}.tmp.1").mkdir()
+
+    # the published copy is checked again within the bandwidth limit
+    limiter = RecordingLimiter()
+    assert migrate_archives(hot, cold, 180, limiter=limiter, today=TODAY) == [
+        cold / ARCHIVE_NAME
+    ]
+    assert sum(limiter.consumed) == sum(
+        (cold / ARCHIVE_NAME / name).stat().st_size
+        for name in read_md5_manifest(hot_dir)
+    )
+    assert hot_dir.is_symlink()
+    assert len((hot / MIGRATION_INDEX).read_text().splitlines()) == 1
+
+
+def test_migration_restores_retired_lane(tmp_path, archived_lanes):
+    hot = tmp_path / "hot"
+    cold = tmp_path / "cold"
+    hot_dir = archived_lanes(hot, lanes=["1"])[0].location
+
+    # crashed after retiring the hot lane but before creating its stub
+    hot_dir.rename(hot / f".{ARCHIVE_NAME}.migrated")
+
+    assert migrate_archives(hot, cold, 180, today=TODAY) == [cold / ARCHIVE_NAME]
+    assert hot_dir.is_symlink()
+    assert not (hot / f".{ARCHIVE_NAME}.migrated").exists()
+
+
+def test_migration_skips_locked_lanes(tmp_path, archived_lanes):
+    hot = tmp_path / "hot"
+    cold = tmp_path / "cold"
+    lane1, lane2 = [result.location for result in archived_lanes(hot)]
+
+    with lane_lock(cold, lane2.name):
+        with pytest.warns(UserWarning, match="another migration holds it"):
+            assert migrate_archives(hot, cold, 180, today=TODAY) == [cold / lane1.name]
+
+        # another migrator has just retired lane 2 and not swapped in its stub
+        retired = hot / f".{lane2.name}.migrated"
+        lane2.rename(retired)
+        assert migrate_archives(hot, cold, 180, today=TODAY) == []
+        assert retired.is_dir() and not lane2.exists()
+
+    # once it lets go, lane 2 is put back and migrated
+    assert migrate_archives(hot, cold, 180, today=TODAY) == [cold / lane2.name]
+    assert lane1.is_symlink() and lane2.is_symlink()
+
+
+def test_main_exits_cleanly(tmp_path, archived_lanes, capsys):
+    hot = tmp_path / "hot"
+    archived_lanes(hot, lanes=["1"])
+    argv = ["--hot-dir", str(hot), "--cold-dir", str(tmp_path / "cold")]
+
+    assert main(argv + ["--dry-run"]) == 0
+    assert main(argv) == 0
+    assert capsys.readouterr().out == f"{ARCHIVE_NAME}\n{ARCHIVE_NAME}\n"
+    assert (hot / ARCHIVE_NAME).is_symlink()
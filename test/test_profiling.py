@@ -0,0 +1,53 @@
+from seqBackupLib.backup import main
+from seqBackupLib.profiling import Profiler
+
+
+def test_profiler_counts_opens(tmp_path):
+    fp = tmp_path / "test.txt"
+    fp.write_text("Hello, World!")
+    profiler = Profiler(use_cprofile=False)
+
+    with profiler.phase("outer"):
+        with profiler.phase("inner"):
+            for _ in range(3):
+                fp.read_text()
+        fp.read_text()
+    fp.read_text()
+
+    inner, outer = profiler.phases
+    assert inner["phase"] == "inner"
+    assert inner["opens"] == 3
+    assert outer["phase"] == "outer"
+    assert outer["opens"] == 4
+    assert outer["seconds"] >= inner["seconds"]
+    assert profiler.report().splitlines()[0].startswith("phase\tseconds\topens")
+
+
+def test_main_writes_profile_report(tmp_path, full_miseq_dir):
+    profile_fp = tmp_path / "profile.tsv"
+    main(
+        [
+            "--forward-reads",
+            str(full_miseq_dir / "Undetermined_S0_L001_R1_001.fastq.gz"),
+            "--destination-dir",
+            str(tmp_path / "raw_reads"),
+            "--sample-sheet",
+            str(full_miseq_dir / "sample_sheet.csv"),
+            "--min-file-size",
+            "100",
+            "--profile",
+            str(profile_fp),
+        ]
+    )
+
+    report = profile_fp.read_text()
+    phases = [line.split("\t")[0] for line in report.split("\n\n")[0].splitlines()]
+    assert phases == [
+        "phase",
+        "parse_r1",
+        "run_info",
+        "open_fastqs",
+        "check_headers",
+        "archive",
+    ]
+    assert "cumulative" in report
@@ -0,0 +1,70 @@
+import pytest
+
+import seqBackupLib.report as report
+from seqBackupLib.report import CACHE_NAME, aggregate, collect_archives, main
+
+
+def test_collect_archives(tmp_path, full_miseq_dir, archived_lanes):
+    raw = tmp_path / "raw_reads"
+    archived_lanes(raw)
+    (raw / "not_an_archive").mkdir()
+
+    archives = collect_archives(raw)
+    assert sorted(archives) == [
+        "250407_M03543_0443_000000000-DTHBL_L001",
+        "250407_M03543_0443_000000000-DTHBL_L002",
+    ]
+    lane1 = archives["250407_M03543_0443_000000000-DTHBL_L001"]
+    assert lane1["machine_type"] == "Illumina-MiSeq"
+    assert lane1["month"] == "2025-04"
+    assert lane1["instrument"] == "M03543"
+    assert lane1["fastq_files"] == 4
+    assert lane1["fastq_bytes"] == sum(
+        (full_miseq_dir / f"Undetermined_S0_L001_{r}_001.fastq.gz").stat().st_size
+        for r in ["R1", "R2", "I1", "I2"]
+    )
+    assert lane1["bytes"] > lane1["fastq_bytes"]
+
+    totals = aggregate(archives, "machine_type")
+    assert list(totals) == ["Illumina-MiSeq"]
+    assert totals["Illumina-MiSeq"]["lanes"] == 2
+    assert totals["Illumina-MiSeq"]["fastq_files"] == 8
+
+
+def test_report_cache_only_scans_new_lanes(
+    tmp_path, archived_lanes, monkeypatch, capsys
+):
+    raw = tmp_path / "raw_reads"
+    archived_lanes(raw)
+    assert main(["--archive-dir", str(raw), "--by", "month"]) == 0
+    assert (raw / CACHE_NAME).is_file()
+    assert capsys.readouterr().out.splitlines()[1].startswith("2025-04\t2\t")
+
+    scanned = []
+    scan_archive = report.scan_archive
+
+    def counting_scan(path):
+        scanned.append(path)
+        return scan_archive(path)
+
+    monkeypatch.setattr(report, "scan_archive", counting_scan)
+    main(["--archive-dir", str(raw), "--by", "month", "flowcell_id"])
+    assert scanned == []
+    month, flowcell = capsys.readouterr().out.split("\n\n")
+    assert month.splitlines()[1].startswith("2025-04\t2\t")
+    assert [line.split("\t")[0] for line in flowcell.splitlines()[1:]] == [
+        "000000000-DTHBL"
+    ]
+
+    main(["--archive-dir", str(raw), "--no-cache"])
+    assert len(scanned) == 2
+
+
+def test_report_without_writable_cache(tmp_path, archived_lanes):
+    raw = tmp_path / "raw_reads"
+    archived_lanes(raw)
+    cache_fp = tmp_path / "read_only" / CACHE_NAME
+
+    with pytest.warns(UserWarning, match="Not caching lane usage"):
+        archives = collect_archives(raw, cache_fp)
+    assert len(archives) == 2
@@ -0,0 +1,101 @@
+import pytest
+
+from seqBackupLib.checksum import return_md5
+from seqBackupLib.restore import (
+    find_archives,
+    main,
+    read_label,
+    read_md5_manifest,
+    restore_archives,
+    restore_file,
+)
+
+ARCHIVE_NAME = "250407_M03543_0443_000000000-DTHBL"
+
+
+@pytest.fixture
+def archive_root(tmp_path, archived_lanes):
+    raw = tmp_path / "raw_reads"
+    archived_lanes(raw)
+    return raw
+
+
+def test_read_label():
+    assert read_label("Undetermined_S0_L001_R1_001.fastq.gz") == "R1"
+    assert read_label("Undetermined_S0_L002_I2_001.fastq.gz") == "I2"
+    with pytest.raises(ValueError):
+        read_label("sample_sheet.csv")
+
+
+def test_find_archives(archive_root):
+    (archive_root / f".{ARCHIVE_NAME}_L003.tmp").mkdir()
+    assert [a.name for a in find_archives(archive_root)] == [
+        f"{ARCHIVE_NAME}_L001",
+        f"{ARCHIVE_NAME}_L002",
+    ]
+    assert [a.name for a in find_archives(archive_root, lanes=["2"])] == [
+        f"{ARCHIVE_NAME}_L002"
+    ]
+    assert find_archives(archive_root, runs=["other_run"]) == []
+
+
+def test_restore_reads_only(archive_root, tmp_path):
+    work = tmp_path / "work"
+    status = main(
+        [
+            "--archive-dir",
+            str(archive_root),
+            "--destination-dir",
+            str(work),
+            "--lane",
+            "1",
+            "--reads",
+            "R1",
+            "R2",
+        ]
+    )
+
+    assert status == 0
+    lane_dir = work / f"{ARCHIVE_NAME}_L001"
+    restored = sorted(lane_dir.glob("*.fastq.gz"))
+    assert restored == [
+        lane_dir / "Undetermined_S0_L001_R1_001.fastq.gz",
+        lane_dir / "Undetermined_S0_L001_R2_001.fastq.gz",
+    ]
+    for fp in restored:
+        assert return_md5(fp) == return_md5(archive_root / lane_dir.name / fp.name)
+    assert (lane_dir / "sample_sheet.csv").is_file()
+    assert read_md5_manifest(lane_dir) == {fp.name: return_md5(fp) for fp in restored}
+    assert not (work / f"{ARCHIVE_NAME}_L002").exists()
+
+
+def test_restore_copies_any_sample_sheet(archive_root, tmp_path):
+    lane_dir = archive_root / f"{ARCHIVE_NAME}_L001"
+    (lane_dir / "sample_sheet.csv").rename(lane_dir / "SampleSheet.txt")
+
+    restore_archives(archive_root, tmp_path / "work", lanes=["1"])
+    restored = tmp_path / "work" / lane_dir.name
+    assert sorted(fp.name for fp in restored.iterdir()) == sorted(
+        fp.name for fp in lane_dir.iterdir()
+    )
+
+
+def test_failed_restore_leaves_no_manifest(archive_root, tmp_path):
+    lane_dir = archive_root / f"{ARCHIVE_NAME}_L001"
+    r2 = lane_dir / "Undetermined_S0_L001_R2_001.fastq.gz"
+    r2.chmod(0o644)
+    r2.write_bytes(b"damaged")
+
+    with pytest.raises(IOError, match="does not match the manifest"):
+        restore_archives(archive_root, tmp_path / "work", lanes=["1"])
+    assert not (tmp_path / "work" / lane_dir.name / f"{lane_dir.name}.md5").exists()
+
+
+def test_restore_file_rejects_bad_digest(tmp_path):
+    src = tmp_path / "src.txt"
+    src.write_text("Hello, World!")
+    dest = tmp_path / "dest.txt"
+
+    with pytest.raises(IOError, match="does not match the manifest"):
+        restore_file(src, dest, "0" * 32)
+    assert list(tmp_path.iterdir()) == [src]
@@ -0,0 +1,141 @@
+import pytest
+from pathlib import Path
+
+from seqBackupLib.backup import archive_fastq
+from seqBackupLib.run_info import find_run_info, parse_run_info
+
+
+def _write_run_info(run_dir: Path, lane_count: int = 2, n_index_reads: int = 2):
+    reads = [(251, "N")] + [(12, "Y")] * n_index_reads + [(251, "N")]
+    read_xml = "".join(
+        f'<Read Number="{n}" NumCycles="{cycles}" IsIndexedRead="{is_index}" />'
+        for n, (cycles, is_index) in enumerate(reads, start=1)
+    )
+    (run_dir / "RunInfo.xml").write_text(
+        '<?xml version="1.0"?>\n'
+        '<RunInfo Version="2">'
+        f'<Run Id="{run_dir.name}" Number="443">'
+        "<Flowcell>000000000-DTHBL</Flowcell>"
+        f"<Reads>{read_xml}</Reads>"
+        f'<FlowcellLayout LaneCount="{lane_count}" SurfaceCount="2" />'
+        "</Run></RunInfo>\n"
+    )
+    (run_dir / "RunParameters.xml").write_text(
+        '<?xml version="1.0"?>\n'
+        "<RunParameters><Setup><ApplicationName>MiSeq Control Software"
+        "</ApplicationName></Setup><RTAVersion>1.18.54</RTAVersion>"
+        "</RunParameters>\n"
+    )
+
+
+def test_parse_run_info(full_miseq_dir):
+    _write_run_info(full_miseq_dir)
+    run_info = find_run_info(full_miseq_dir / "Undetermined_S0_L001_R1_001.fastq.gz")
+
+    assert run_info.run_id == full_miseq_dir.name
+    assert run_info.lane_count == 2
+    assert [read["cycles"] for read in run_info.reads] == [251, 12, 12, 251]
+    assert run_info.index_read_count == 2
+    assert run_info.parameters == {
+        "ApplicationName": "MiSeq Control Software",
+        "RTAVersion": "1.18.54",
+    }
+    # every lane of a run shares the parsed metadata
+    assert parse_run_info(full_miseq_dir / "RunInfo.xml") is run_info
+
+
+def test_find_run_info_missing(tmp_path):
+    assert find_run_info(tmp_path / "Undetermined_S0_L001_R1_001.fastq.gz") is None
+
+
+def test_find_run_info_novaseqx_onboard_output(novaseqx_dir):
+    _write_run_info(novaseqx_dir, lane_count=8)
+    fastq_dir = novaseqx_dir / "Analysis" / "1" / "Data" / "fastq"
+    fastq_dir.mkdir(parents=True)
+
+    run_info = find_run_info(fastq_dir / "Undetermined_S0_L001_R1_001.fastq.gz")
+    assert run_info.lane_count == 8
+
+
+def test_unreadable_run_info_is_ignored(tmp_path, full_miseq_dir):
+    fastq = full_miseq_dir / "Undetermined_S0_L001_R1_001.fastq.gz"
+    (full_miseq_dir / "RunInfo.xml").write_text('<?xml version="1.0"?>\n<RunInfo><Run')
+    with pytest.warns(UserWarning, match="Ignoring unreadable"):
+        assert find_run_info(fastq) is None
+
+    (full_miseq_dir / "RunInfo.xml").write_text(
+        '<RunInfo><Run Id="x"><Reads><Read Number="1" /></Reads></Run></RunInfo>'
+    )
+    with pytest.warns(UserWarning, match="Ignoring unreadable"):
+        result = archive_fastq(
+            fastq,
+            tmp_path / "raw_reads",
+            full_miseq_dir / "sample_sheet.csv",
+            True,
+            100,
+        )
+    assert result.run_info is None
+
+
+def test_run_info_of_another_run_is_ignored(tmp_path, full_miseq_dir):
+    fastq = full_miseq_dir / "Undetermined_S0_L001_R1_001.fastq.gz"
+    # a stray RunInfo.xml above the run folder is never looked at
+    outside = tmp_path / "other_run"
+    outside.mkdir()
+    _write_run_info(outside, n_index_reads=1)
+    (outside / "RunInfo.xml").rename(tmp_path / "RunInfo.xml")
+    assert find_run_info(fastq, full_miseq_dir.name) is None
+
+    # nor is one inside it that describes a different run
+    _write_run_info(full_miseq_dir, n_index_reads=1)
+    (full_miseq_dir / "RunInfo.xml").write_text(
+        (full_miseq_dir / "RunInfo.xml")
+        .read_text()
+        .replace(full_miseq_dir.name, "250101_M03543_0001_000000000-AAAAA")
+    )
+    with pytest.warns(UserWarning, match="describes run 250101_M03543_0001"):
+        result = archive_fastq(
+            fastq,
+            tmp_path / "raw_reads",
+            full_miseq_dir / "sample_sheet.csv",
+            True,
+            100,
+        )
+    assert result.run_info is None
+    assert "Undetermined_S0_L001_I2_001.fastq.gz" in result.md5s
+
+
+def test_archive_fastq_single_index_run(tmp_path, full_miseq_dir):
+    _write_run_info(full_miseq_dir, n_index_reads=1)
+    (full_miseq_dir / "Undetermined_S0_L001_I2_001.fastq.gz").unlink()
+
+    result = archive_fastq(
+        full_miseq_dir / "Undetermined_S0_L001_R1_001.fastq.gz",
+        tmp_path / "raw_reads",
+        full_miseq_dir / "sample_sheet.csv",
+        True,
+        100,
+    )
+
+    assert sorted(result.md5s) == [
+        "Undetermined_S0_L001_I1_001.fastq.gz",
+        "Undetermined_S0_L001_R1_001.fastq.gz",
+        "Undetermined_S0_L001_R2_001.fastq.gz",
+    ]
+    assert result.run_info["lane_count"] == 2
+    assert [check.name for check in result.checks if check.name == "run_info"] == [
+        "run_info"
+    ]
+
+
+def test_archive_fastq_lane_not_on_flowcell(tmp_path, full_miseq_dir):
+    _write_run_info(full_miseq_dir, lane_count=1)
+
+    with pytest.raises(ValueError, match="not on the flowcell"):
+        archive_fastq(
+            full_miseq_dir / "Undetermined_S0_L002_R1_001.fastq.gz",
+            tmp_path / "raw_reads",
+            full_miseq_dir / "sample_sheet.csv",
+            True,
+            100,
+        )
@@ -0,0 +1,112 @@
+import gzip
+
+import pytest
+
+from seqBackupLib.backup import backup_fastq
+from seqBackupLib.illumina import IlluminaFastq
+from seqBackupLib.sample_sheet import (
+    check_sample_sheet,
+    parse_sample_sheet,
+    reverse_complement,
+)
+
+SAMPLE_SHEET_V1 = """[Header]
+IEMFileVersion,4
+Experiment Name,Test
+,,,
+[Reads]
+251
+251
+[Data]
+Lane,Sample_ID,Sample_Name,index,index2
+1,S1,S1,TTTTTTTTTTTT,AAGGAAAAAGAA
+1,S2,S2,ACGTACGTACGT,ACGTACGTACGT
+"""
+
+SAMPLE_SHEET_V2 = """[Header]
+FileFormatVersion,2
+RunName,Test
+[BCLConvert_Settings]
+SoftwareVersion,3.9.3
+[BCLConvert_Data]
+Lane,Sample_ID,Index,Index2
+2,S1,GGGGGGGGGGGG,CCCCCCCCCCCC
+"""
+
+
+def test_parse_sample_sheet(tmp_path):
+    v1 = tmp_path / "v1.csv"
+    v1.write_text(SAMPLE_SHEET_V1)
+    sheet = parse_sample_sheet(v1)
+    assert sheet.version == 1
+    assert len(sheet.samples) == 2
+    assert sheet.lanes == {"1"}
+    assert sheet.indexes == {
+        ("TTTTTTTTTTTT", "AAGGAAAAAGAA"),
+        ("ACGTACGTACGT", "ACGTACGTACGT"),
+    }
+    assert parse_sample_sheet(v1) is sheet
+
+    v2 = tmp_path / "v2.csv"
+    v2.write_text(SAMPLE_SHEET_V2)
+    sheet = parse_sample_sheet(v2)
+    assert sheet.version == 2
+    assert sheet.lanes == {"2"}
+    assert sheet.indexes == {("GGGGGGGGGGGG", "CCCCCCCCCCCC")}
+
+    # an edited sheet is parsed again
+    v1.write_text(SAMPLE_SHEET_V2)
+    assert parse_sample_sheet(v1).version == 2
+
+
+def test_reverse_complement():
+    assert reverse_complement("AACGTN") == "NACGTT"
+
+
+def test_check_sample_sheet(miseq_dir, tmp_path):
+    good = tmp_path / "good.csv"
+    good.write_text(SAMPLE_SHEET_V1)
+    with gzip.open(miseq_dir / "Undetermined_S0_L001_R1_001.fastq.gz", "rt") as f:
+        results = check_sample_sheet(parse_sample_sheet(good), IlluminaFastq(f))
+    assert results[0], results
+    assert results[4] == 0.5
+
+    bad = tmp_path / "bad.csv"
+    bad.write_text(SAMPLE_SHEET_V2)
+    with gzip.open(miseq_dir / "Undetermined_S0_L001_R1_001.fastq.gz", "rt") as f:
+        results = check_sample_sheet(parse_sample_sheet(bad), IlluminaFastq(f))
+    assert results == [False, True, False, False, 0.0]
+
+    empty = miseq_dir / "sample_sheet.csv"
+    with gzip.open(miseq_dir / "Undetermined_S0_L001_R1_001.fastq.gz", "rt") as f:
+        results = check_sample_sheet(parse_sample_sheet(empty), IlluminaFastq(f))
+    assert not results[0]
+    assert not results[1]
+
+
+def test_backup_fastq_validates_sample_sheet(tmp_path, full_miseq_dir):
+    sample_sheet_fp = tmp_path / "sample_sheet.csv"
+    sample_sheet_fp.write_text(SAMPLE_SHEET_V2)
+    raw = tmp_path / "raw_reads"
+
+    with pytest.raises(ValueError, match="sample sheet doesn't match"):
+        backup_fastq(
+            full_miseq_dir / "Undetermined_S0_L001_R1_001.fastq.gz",
+            raw,
+            sample_sheet_fp,
+            True,
+            100,
+            validate_sample_sheet=True,
+        )
+    assert not (raw / "250407_M03543_0443_000000000-DTHBL_L001").exists()
+
+    sample_sheet_fp.write_text(SAMPLE_SHEET_V1)
+    out_dir = backup_fastq(
+        full_miseq_dir / "Undetermined_S0_L001_R1_001.fastq.gz",
+        raw,
+        sample_sheet_fp,
+        True,
+        100,
+        validate_sample_sheet=True,
+    )
+    assert (out_dir / "sample_sheet.csv").is_file()
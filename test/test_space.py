@@ -0,0 +1,96 @@
+import os
+import socket
+import stat
+import threading
+
+import pytest
+
+import seqBackupLib.space as space
+from seqBackupLib.space import (
+    RESERVATION_DIR,
+    reservation_dir,
+    reserve_space,
+    reserved_space,
+)
+
+
+def test_reservation_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(space, "available_space", lambda dest_dir: 100)
+    assert reservation_dir(tmp_path / "a") == tmp_path / "a" / RESERVATION_DIR
+    assert reservation_dir(tmp_path / "a", tmp_path) == tmp_path / RESERVATION_DIR
+
+    umask = os.umask(0o022)
+    try:
+        with reserve_space(tmp_path, "run_L001", 60):
+            pass
+    finally:
+        os.umask(umask)
+    # other users' backups have to be able to add their own reservations
+    reservations = reservation_dir(tmp_path)
+    assert stat.S_IMODE(reservations.stat().st_mode) == 0o2775
+    assert stat.S_IMODE((reservations / ".lock").stat().st_mode) == 0o664
+    assert sorted(p.name for p in tmp_path.iterdir()) == [RESERVATION_DIR]
+
+
+def test_reserve_space_tracks_in_flight_archives(tmp_path, monkeypatch):
+    monkeypatch.setattr(space, "available_space", lambda dest_dir: 100)
+
+    with reserve_space(tmp_path, "run_L001", 60) as first:
+        assert reserved_space(tmp_path) == 60
+        with pytest.raises(IOError, match="Not enough free space"):
+            with reserve_space(tmp_path, "run_L002", 60):
+                pass
+
+        first.consume(50)
+        assert reserved_space(tmp_path) == 10
+        with reserve_space(tmp_path, "run_L002", 60):
+            assert reserved_space(tmp_path) == 70
+
+    assert reserved_space(tmp_path) == 0
+
+
+def test_reserved_space_is_shared_across_roots(tmp_path, monkeypatch):
+    monkeypatch.setattr(space, "available_space", lambda dest_dir: 100)
+    hot = tmp_path / "hot"
+    other = tmp_path / "other"
+    other.mkdir()
+
+    with reserve_space(hot, "run_L001", 60, shared_dir=tmp_path):
+        assert reserved_space(other) == 0
+        assert reserved_space(other, tmp_path) == 60
+        with pytest.raises(IOError, match="Not enough free space"):
+            with reserve_space(other, "run_L001", 60, shared_dir=tmp_path):
+                pass
+
+
+def test_consume_never_hides_a_reservation(tmp_path, monkeypatch):
+    monkeypatch.setattr(space, "available_space", lambda dest_dir: 10**13)
+    # readers must always see the old or new size, never an empty file
+    with reserve_space(tmp_path, "run_L001", 10**12) as reservation:
+        done = threading.Event()
+
+        def consume():
+            while not done.is_set():
+                reservation.consume(1)
+
+        consumer = threading.Thread(target=consume)
+        consumer.start()
+        try:
+            for _ in range(200):
+                assert reserved_space(tmp_path) > 0
+        finally:
+            done.set()
+            consumer.join()
+
+
+def test_reserved_space_prunes_dead_processes(tmp_path, monkeypatch):
+    monkeypatch.setattr(space, "_pid_is_alive", lambda pid: pid == os.getpid())
+    tmp_reservation_dir = reservation_dir(tmp_path)
+    tmp_reservation_dir.mkdir()
+    host = socket.gethostname()
+    (tmp_reservation_dir / "dead.reserve").write_text(f"{host}\t1\t100\n")
+    (tmp_reservation_dir / "alive.reserve").write_text(f"{host}\t{os.getpid()}\t7\n")
+    (tmp_reservation_dir / "remote.reserve").write_text("other-host\t1\t3\n")
+
+    assert reserved_space(tmp_path) == 10
+    assert not (tmp_reservation_dir / "dead.reserve").exists()
@@ -0,0 +1,84 @@
+import platform
+import subprocess
+import sys
+from datetime import datetime
+from datetime import time as dtime
+
+import pytest
+
+from seqBackupLib.throttle import RateLimiter, parse_bandwidth_schedule, parse_rate
+
+
+def test_parse_rate():
+    assert parse_rate("0") == 0
+    assert parse_rate("512") == 512
+    assert parse_rate("20k") == 20 * 1024
+    assert parse_rate("50M") == 50 * 1024**2
+    assert parse_rate("1G") == 1024**3
+    with pytest.raises(ValueError):
+        parse_rate("fast")
+
+
+def test_parse_bandwidth_schedule():
+    assert parse_bandwidth_schedule("10M") == [(dtime(0, 0), dtime(0, 0), 10 * 1024**2)]
+    assert parse_bandwidth_schedule("08:00-18:00=20M,18:00-08:00=0") == [
+        (dtime(8, 0), dtime(18, 0), 20 * 1024**2),
+        (dtime(18, 0), dtime(8, 0), 0),
+    ]
+    with pytest.raises(ValueError):
+        parse_bandwidth_schedule("8am-6pm=20M")
+
+
+def test_rate_limiter_follows_schedule():
+    schedule = parse_bandwidth_schedule("08:00-18:00=20M,18:00-08:00=0")
+    limiter = RateLimiter(schedule, now=lambda: datetime(2025, 1, 1, 12, 0))
+    assert limiter.rate() == 20 * 1024**2
+    limiter = RateLimiter(schedule, now=lambda: datetime(2025, 1, 1, 2, 0))
+    assert limiter.rate() == 0
+
+
+def test_rate_limiter_consume_sleeps_off_debt():
+    clock = [0.0]
+    sleeps = []
+
+    def sleep(seconds):
+        sleeps.append(seconds)
+        clock[0] += seconds
+
+    limiter = RateLimiter(
+        parse_bandwidth_schedule("100"), clock=lambda: clock[0], sleep=sleep
+    )
+    limiter.consume(50)
+    limiter.consume(150)
+    assert sleeps == [0.5, 1.5]
+
+    # an idle bucket refills up to one second of traffic
+    clock[0] += 10
+    limiter.consume(100)
+    assert sleeps == [0.5, 1.5]
+
+    unlimited = RateLimiter(parse_bandwidth_schedule("0"), sleep=sleep)
+    unlimited.consume(10**9)
+    assert sleeps == [0.5, 1.5]
+
+
+SYS_IOPRIO_GET = {"x86_64": 252, "aarch64": 31}
+
+
+@pytest.mark.skipif(
+    sys.platform != "linux" or platform.machine() not in SYS_IOPRIO_GET,
+    reason="ioprio_get is only wired up for Linux x86_64 and aarch64 here",
+)
+def test_set_io_priority():
+    # run in a child so the test process keeps its own I/O priority
+    code = (
+        "import ctypes, platform\n"
+        "from seqBackupLib.throttle import set_io_priority\n"
+        "set_io_priority('idle')\n"
+        "libc = ctypes.CDLL(None)\n"
+        f"print(libc.syscall({SYS_IOPRIO_GET[platform.machine()]}, 1, 0))\n"
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True
+    ).stdout
+    assert int(output) == 3 << 13